@@ -0,0 +1,180 @@
+# batch.py
+
+# This simplifies scripts, or streams of expressions, without any GUI, spread over a pool of processes.
+# For example...
+#
+#   python batch.py scripts/test*.py --timeout 60 --output results.jsonl
+#   python batch.py --jsonl expressions.jsonl --processes 32
+#
+# A script is executed just as the GUI executes it, and its result is whatever it assigns to 'root'.
+# Each line of a JSONL input is either an object with an "expression" (a Python expression), "code"
+# (a script), "text" (a tree as written by expression_text()) or "tree" (a tree as serialized by to_list())
+# member, and optionally an "id" member, or else just a string holding an expression.
+# Results are written as JSON lines, in the order of the inputs, as soon as each one is ready.  With --trees,
+# each also holds the serialized result tree in its "tree" member, so the output can be fed back in as input.
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from math_tree import MathTreeNodeFactory, _get_rewrite_engine, make_script_globals, simplify_tree
+from serialization import from_list, parse_expression_text, to_list
+
+class JobTimeout(Exception):
+    pass
+
+def _raise_job_timeout(signum, frame):
+    raise JobTimeout()
+
+def _ignore_log(message):
+    pass
+
+_job_kind_list = ['expression', 'code', 'text', 'tree']
+
+def _build_tree(job):
+    # Trees given as text or serialized are read back directly, without running any Python.
+    if 'tree' in job:
+        return from_list(job['tree'], MathTreeNodeFactory())
+    if 'text' in job:
+        return parse_expression_text(job['text'])
+    globals_dict = make_script_globals()
+    if 'expression' in job:
+        return eval(job['expression'], globals_dict)
+    locals_dict = {}
+    exec(job['code'], globals_dict, locals_dict)
+    if 'root' not in locals_dict:
+        raise Exception('Script did not assign root.')
+    return locals_dict['root']
+
+# Each worker opens the cache for itself, because an SQLite connection can't be shared between processes.
+# Results go back to the main process through a queue of our own, rather than as what the pool's tasks return,
+# so that a worker can send the result of a job that timed out and then exit; see _run_job().
+_expression_cache = None
+_result_queue = None
+
+def _init_worker(path, result_queue):
+    global _expression_cache, _result_queue
+    _result_queue = result_queue
+    if path is not None:
+        from expression_cache import ExpressionCache
+        _expression_cache = ExpressionCache(path)
+    # Workers are usually forked from the main process, which has made the engine already, but not always.
+    _get_rewrite_engine()
+
+def _run_job(index, args):
+    job, timeout, max_tree_size, include_tree, blade_sum = args
+    result = {'id': job['id']}
+    start_time = time.perf_counter()
+    # We can only interrupt a runaway simplification where there are POSIX interval timers (see main().)
+    # The tree size, on the other hand, is checked by the engine after every manipulation.
+    use_timer = timeout is not None and hasattr(signal, 'setitimer')
+    timed_out = False
+    if use_timer:
+        signal.signal(signal.SIGALRM, _raise_job_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        node = simplify_tree(_build_tree(job), log=_ignore_log, persistent=True, cache=_expression_cache, blade_sum=blade_sum, max_tree_size=max_tree_size)
+        tree_size = node.size()
+        result['result'] = node.expression_text()
+        result['tree_size'] = tree_size
+        if include_tree:
+            result['tree'] = to_list(node)
+    except JobTimeout:
+        result['error'] = 'Timed out after %g seconds.' % timeout
+        timed_out = True
+    except Exception as ex:
+        result['error'] = str(ex)
+    finally:
+        if use_timer:
+            signal.setitimer(signal.ITIMER_REAL, 0.0)
+    result['seconds'] = time.perf_counter() - start_time
+    # A job that timed out may have been interrupted anywhere, even half way through writing to the cache, so
+    # this worker isn't to be trusted with another.  It exits once the result is sent, and the pool replaces it.
+    # Workers are otherwise kept for as many jobs as there are, since starting one costs more than most jobs.
+    _result_queue.put((index, result))
+    if timed_out:
+        os._exit(0)
+
+def _read_jobs(path_list, jsonl_path):
+    job_list = []
+    for path in path_list:
+        with open(path, 'r') as handle:
+            job_list.append({'id': path, 'code': handle.read()})
+    if jsonl_path is not None:
+        handle = sys.stdin if jsonl_path == '-' else open(jsonl_path, 'r')
+        try:
+            for i, line in enumerate(handle):
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                # A line we can't make sense of gets an error of its own, rather than stopping the whole run.
+                try:
+                    job = json.loads(line)
+                except ValueError as ex:
+                    job_list.append({'id': i + 1, 'error': 'Line %d is not JSON: %s' % (i + 1, str(ex))})
+                    continue
+                if isinstance(job, str):
+                    job = {'expression': job}
+                if not isinstance(job, dict) or not any([kind in job for kind in _job_kind_list]):
+                    job_list.append({'id': job.get('id', i + 1) if isinstance(job, dict) else i + 1,
+                                     'error': 'Line %d has no %s.' % (i + 1, ', '.join(_job_kind_list))})
+                    continue
+                job.setdefault('id', i + 1)
+                job_list.append(job)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+    return job_list
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simplify math tree scripts or expressions without a GUI.')
+    parser.add_argument('scripts', nargs='*', help='script files, each assigning its tree to root')
+    parser.add_argument('--jsonl', help='a file of JSON lines holding expressions, or - for stdin')
+    parser.add_argument('--output', help='where to write the JSON lines of results (default: stdout)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='size of the process pool')
+    parser.add_argument('--timeout', type=float, help='seconds allowed per job')
+    parser.add_argument('--max-tree-size', type=int, help='fail any job whose tree grows bigger than this while simplifying')
+    parser.add_argument('--cache', help='an SQLite file in which to cache simplified expressions across runs')
+    parser.add_argument('--trees', action='store_true', help='include each serialized result tree in its record')
+    parser.add_argument('--blade-sum', action='store_true', help='use the blade-sum engine where it applies (faster, but see simplify_tree)')
+    args = parser.parse_args(argv)
+
+    job_list = _read_jobs(args.scripts, args.jsonl)
+    if len(job_list) == 0:
+        parser.error('nothing to simplify')
+    if args.timeout is not None and not hasattr(signal, 'setitimer'):
+        sys.stderr.write('Warning: --timeout is not supported on this platform, so jobs will run without a time limit.\n')
+    # The workers are forked with the engine already made, rather than each making it for itself.
+    _get_rewrite_engine()
+    result_map = {}
+    result_queue = multiprocessing.SimpleQueue()
+    failure_count = 0
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        with multiprocessing.Pool(max(1, args.processes), _init_worker, (args.cache, result_queue)) as pool:
+            for i, job in enumerate(job_list):
+                if not any([kind in job for kind in _job_kind_list]):
+                    result_map[i] = {'id': job['id'], 'error': job['error']}
+                else:
+                    pool.apply_async(_run_job, (i, (job, args.timeout, args.max_tree_size, args.trees, args.blade_sum)))
+            # Results come back in any order, but are written in the order of the jobs, each as soon as it can be.
+            for i in range(len(job_list)):
+                while i not in result_map:
+                    index, result = result_queue.get()
+                    result_map[index] = result
+                result = result_map.pop(i)
+                if 'error' in result:
+                    failure_count += 1
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failure_count > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# benchmark.py
+
+# This times the simplification of the scripts in the scripts folder, along with some generated workloads
+# of growing size, and optionally compares the results against a stored baseline.  For example...
+#
+#   python benchmark.py --save-baseline baseline.json
+#   python benchmark.py --baseline baseline.json --time-threshold 0.2
+#
+# Each workload is run with each engine: 'blade' is simplify_tree() with its blade-sum engine, 'tree' is the
+# rewrite engine alone, which is what the GUI steps through, 'memo' is the rewrite engine simplifying
+# bottom-up through a SubtreeMemo, and 'parallel' is a ParallelSimplifier, which splits the tree into summands
+# and simplifies those in a pool of processes.  Rewrite counts, tree sizes and the time spent in each
+# manipulator are only meaningful for 'tree' and 'memo'.
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from math_tree import MathTreeNode, make_script_globals, make_rewrite_engine, simplify_tree
+from rewrite_engine import RewriteStats, SubtreeMemo
+
+def _generic_vector(name, basis_list):
+    # A vector with a symbolic coordinate on each of the given basis vectors.
+    return MathTreeNode('+', [MathTreeNode('*', [MathTreeNode('$%s%d' % (name, i + 1)), MathTreeNode(basis)]) for i, basis in enumerate(basis_list)])
+
+def _conformal_point(name):
+    v = _generic_vector(name, ['e1', 'e2', 'e3'])
+    return MathTreeNode('+', [MathTreeNode('no'), v, MathTreeNode('*', [MathTreeNode(0.5), MathTreeNode('.', [v.copy(), v.copy()]), MathTreeNode('ni')])])
+
+def _make_wedge(count):
+    # The outer product of the given number of generic vectors in the conformal basis.
+    basis_list = ['e1', 'e2', 'e3', 'no', 'ni']
+    return MathTreeNode('^', [_generic_vector(chr(ord('a') + i), basis_list) for i in range(count)])
+
+def _make_point_product(count):
+    # The geometric product of the given number of conformal points.
+    return MathTreeNode('*', [_conformal_point(chr(ord('a') + i)) for i in range(count)])
+
+# These are the generated workloads, each at a few sizes, so that we can see how the cost grows.
+generated_workload_map = {
+    'wedge': (_make_wedge, [2, 3, 4]),
+    'point_product': (_make_point_product, [1, 2, 3]),
+}
+
+def load_workloads(script_dir, pattern=None):
+    workload_list = []
+    path_list = sorted(glob.glob(os.path.join(script_dir, '*.py')), key=lambda path: (len(path), path))
+    for path in path_list:
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'r') as handle:
+            code = handle.read()
+        workload_list.append((name, lambda code=code: _run_script(code)))
+    for name, (function, size_list) in generated_workload_map.items():
+        for size in size_list:
+            workload_list.append(('%s_%d' % (name, size), lambda function=function, size=size: function(size)))
+    if pattern is not None:
+        workload_list = [(name, builder) for name, builder in workload_list if pattern in name]
+    return workload_list
+
+def _run_script(code):
+    locals_dict = {}
+    exec(code, make_script_globals(), locals_dict)
+    return locals_dict['root']
+
+def _ignore_log(message):
+    pass
+
+def run_workload(builder, engine_name, max_iters, max_tree_size, measure_memory, parallel=None):
+    root = builder()
+    result = {'input_size': root.size()}
+    stats = RewriteStats()
+    if engine_name == 'tree':
+        engine = make_rewrite_engine()
+        simplify = lambda: engine.manipulate_tree(root, max_iters, max_tree_size, log=_ignore_log, stats=stats)
+    elif engine_name == 'memo':
+        engine = make_rewrite_engine()
+        simplify = lambda: engine.manipulate_tree(root, None, max_tree_size, log=_ignore_log, stats=stats, memo=SubtreeMemo())
+    elif engine_name == 'parallel':
+        simplify = lambda: parallel.simplify(root, log=_ignore_log)
+    else:
+        simplify = lambda: simplify_tree(root, log=_ignore_log, persistent=True, stats=stats, blade_sum=True)
+    if measure_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        node = simplify()
+        result['output_size'] = node.size()
+        if stats.rewrite_count() == max_iters:
+            result['error'] = 'Reached the limit of %d rewrites.' % max_iters
+    except Exception as ex:
+        result['error'] = str(ex)
+    result['seconds'] = time.perf_counter() - start_time
+    if measure_memory:
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    result['rewrite_count'] = stats.rewrite_count()
+    result['peak_tree_size'] = max([result['input_size']] + stats.tree_size_history)
+    result['tree_size_history'] = stats.tree_size_history
+    if len(stats.manipulator_name_list) > 0:
+        result['nodes_visited'] = stats.visit_count()
+        result['manipulator_map'] = {name: {
+            'attempts': stats.attempt_count_list[i],
+            'hits': stats.hit_count_list[i],
+            'seconds': stats.seconds_list[i],
+        } for i, name in enumerate(stats.manipulator_name_list)}
+    return result
+
+def run_benchmarks(workload_list, engine_list, repeat=3, max_iters=10000, max_tree_size=None, measure_memory=True, log=print, parallel=None):
+    # The 'parallel' engine needs a ParallelSimplifier, whose pool should already be started.
+    # Get the imports and the default engine out of the way, so that the first workload isn't charged for them.
+    simplify_tree(MathTreeNode('+', [MathTreeNode('a'), MathTreeNode('a')]), log=_ignore_log)
+    results = {}
+    for name, builder in workload_list:
+        for engine_name in engine_list:
+            key = '%s/%s' % (name, engine_name)
+            # Memory is measured in a run of its own, because tracing allocations slows everything down.
+            best = None
+            for i in range(repeat):
+                result = run_workload(builder, engine_name, max_iters, max_tree_size, False, parallel)
+                if best is None or result['seconds'] < best['seconds']:
+                    best = result
+            if measure_memory:
+                best['peak_memory'] = run_workload(builder, engine_name, max_iters, max_tree_size, True, parallel)['peak_memory']
+            results[key] = best
+            log('%-24s %10.4f s %6d rewrites %8d peak size %10d peak bytes%s' % (
+                key, best['seconds'], best['rewrite_count'], best['peak_tree_size'], best.get('peak_memory', 0),
+                '  (%s)' % best['error'] if 'error' in best else ''))
+    return results
+
+def compare_results(results, baseline, threshold_map, log=print):
+    # A measure regresses when it grows by more than its threshold, as a fraction of the baseline value.
+    # Times below the noise floor are ignored, as is any workload that is not in both sets of results.
+    regression_list = []
+    for key in sorted(results.keys()):
+        if key not in baseline:
+            continue
+        result = results[key]
+        base = baseline[key]
+        if 'error' in result and 'error' not in base:
+            regression_list.append('%s: now fails (%s)' % (key, result['error']))
+            continue
+        for measure, threshold in threshold_map.items():
+            if measure not in result or measure not in base:
+                continue
+            if measure == 'seconds' and base[measure] < 0.001:
+                continue
+            if result[measure] > base[measure] * (1.0 + threshold):
+                regression_list.append('%s: %s went from %g to %g' % (key, measure, base[measure], result[measure]))
+    for regression in regression_list:
+        log('REGRESSION ' + regression)
+    return regression_list
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the simplification of math trees.')
+    parser.add_argument('--scripts', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'), help='folder of scripts to run')
+    parser.add_argument('--filter', help='only run workloads whose names contain this')
+    parser.add_argument('--engine', choices=['blade', 'tree', 'memo', 'parallel', 'all'], default='all', help='which engine to run')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='size of the process pool for the parallel engine')
+    parser.add_argument('--chunk-size', type=int, help='summands per task for the parallel engine')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per workload; the fastest is kept')
+    parser.add_argument('--max-iters', type=int, default=10000, help='rewrite limit for the tree engine')
+    parser.add_argument('--max-tree-size', type=int, default=200000, help='tree size limit for the tree engine')
+    parser.add_argument('--skip-memory', action='store_true', help='do not measure peak memory, which takes an extra run')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results against this JSON file')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file as the new baseline')
+    parser.add_argument('--time-threshold', type=float, default=0.25, help='allowed fractional increase in time')
+    parser.add_argument('--size-threshold', type=float, default=0.0, help='allowed fractional increase in tree sizes and rewrites')
+    parser.add_argument('--memory-threshold', type=float, default=0.25, help='allowed fractional increase in peak memory')
+    args = parser.parse_args(argv)
+
+    engine_list = ['blade', 'tree', 'memo', 'parallel'] if args.engine == 'all' else [args.engine]
+    parallel = None
+    if 'parallel' in engine_list:
+        from parallel_simplify import ParallelSimplifier
+        parallel = ParallelSimplifier(args.processes, args.chunk_size)
+        parallel.start()
+    try:
+        results = run_benchmarks(load_workloads(args.scripts, args.filter), engine_list, args.repeat, args.max_iters, args.max_tree_size, not args.skip_memory, parallel=parallel)
+    finally:
+        if parallel is not None:
+            parallel.close()
+    document = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2, sort_keys=True)
+    for path in [args.output, args.save_baseline]:
+        if path is not None:
+            with open(path, 'w') as handle:
+                handle.write(document + '\n')
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as handle:
+            baseline = json.load(handle)['results']
+        threshold_map = {
+            'seconds': args.time_threshold,
+            'rewrite_count': args.size_threshold,
+            'peak_tree_size': args.size_threshold,
+            'output_size': args.size_threshold,
+            'peak_memory': args.memory_threshold,
+        }
+        if len(compare_results(results, baseline, threshold_map)) > 0:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# blade_sum.py
+
+from math_tree import MathTreeNode
+
+# This is the alternative data-structure described at the bottom of math_tree.py.  Any fully simplified
+# GA expression is a sum over blades, each blade being a polynomial paired with an ordered set of vectors.
+# Here a blade is a sorted tuple of vector names, and a polynomial is a map from monomials to float
+# coefficients.  A monomial is a sorted tuple of scalar atoms, where an atom is either a 1-tuple holding
+# the name of a scalar symbol (e.g., ('$x',)), or a 2-tuple holding the names of two vectors whose inner
+# product the bilinear form could not evaluate (e.g., ('a', 'b')).
+
+def _add_into(term_map, blade, polynomial, scale=1.0):
+    # Note that we never modify a polynomial in place, because they may be shared between term maps.
+    existing = term_map.get(blade)
+    result = {} if existing is None else dict(existing)
+    for monomial, coefficient in polynomial.items():
+        coefficient = result.get(monomial, 0.0) + scale * coefficient
+        if coefficient == 0.0:
+            result.pop(monomial, None)
+        else:
+            result[monomial] = coefficient
+    if len(result) > 0:
+        term_map[blade] = result
+    else:
+        term_map.pop(blade, None)
+
+def _multiply_polynomials(polynomial_a, polynomial_b):
+    result = {}
+    for monomial_a, coefficient_a in polynomial_a.items():
+        for monomial_b, coefficient_b in polynomial_b.items():
+            monomial = tuple(sorted(monomial_a + monomial_b))
+            coefficient = result.get(monomial, 0.0) + coefficient_a * coefficient_b
+            if coefficient == 0.0:
+                result.pop(monomial, None)
+            else:
+                result[monomial] = coefficient
+    return result
+
+def _wedge_blades(blade_a, blade_b):
+    # Return the sign and blade of the outer product of the two given blades, or a zero sign if it vanishes.
+    vector_list = blade_a + blade_b
+    if len(set(vector_list)) < len(vector_list):
+        return 0, None
+    inversion_count = 0
+    for i in range(len(blade_a)):
+        for j in range(len(blade_b)):
+            if blade_a[i] > blade_b[j]:
+                inversion_count += 1
+    return -1 if inversion_count % 2 == 1 else 1, tuple(sorted(vector_list))
+
+class BladeSum(object):
+    def __init__(self, term_map=None):
+        self.term_map = {} if term_map is None else term_map
+
+    @staticmethod
+    def scalar(value):
+        return BladeSum({(): {(): value}} if value != 0.0 else {})
+
+    @staticmethod
+    def symbol(name):
+        return BladeSum({(): {((name,),): 1.0}})
+
+    @staticmethod
+    def vector(name):
+        return BladeSum({(name,): {(): 1.0}})
+
+    def add(self, other, scale=1.0):
+        term_map = dict(self.term_map)
+        for blade, polynomial in other.term_map.items():
+            _add_into(term_map, blade, polynomial, scale)
+        return BladeSum(term_map)
+
+    def outer_product(self, other):
+        term_map = {}
+        for blade_a, polynomial_a in self.term_map.items():
+            for blade_b, polynomial_b in other.term_map.items():
+                sign, blade = _wedge_blades(blade_a, blade_b)
+                if sign != 0:
+                    _add_into(term_map, blade, _multiply_polynomials(polynomial_a, polynomial_b), float(sign))
+        return BladeSum(term_map)
+
+    def reverse(self):
+        term_map = {}
+        for blade, polynomial in self.term_map.items():
+            grade = len(blade)
+            _add_into(term_map, blade, polynomial, -1.0 if (grade * (grade - 1) // 2) % 2 == 1 else 1.0)
+        return BladeSum(term_map)
+
+    def scalar_constant(self):
+        # Return the value of this sum if it is a plain number, or None otherwise.
+        if len(self.term_map) == 0:
+            return 0.0
+        if len(self.term_map) == 1:
+            polynomial = self.term_map.get(())
+            if polynomial is not None and len(polynomial) == 1 and () in polynomial:
+                return polynomial[()]
+        return None
+
+class BladeSumCalculator(object):
+    def __init__(self, bilinear_form):
+        self.bilinear_form = bilinear_form
+        # Products of blades are memoized, because the same pairs come up again and again.
+        self.product_cache = {}
+
+    def simplify(self, node):
+        # Return the fully simplified form of the given tree, or None if it uses anything we don't support.
+        blade_sum = self.from_tree(node)
+        if blade_sum is None:
+            return None
+        return self.to_tree(blade_sum)
+
+    def from_tree(self, node):
+        if len(node.child_list) == 0:
+            if isinstance(node.data, float):
+                return BladeSum.scalar(node.data)
+            if isinstance(node.data, str) and len(node.data) > 0:
+                if node.data[0] == '$':
+                    return BladeSum.symbol(node.data)
+                if node.data[0].isalpha():
+                    return BladeSum.vector(node.data)
+        operand_list = []
+        for child in node.child_list:
+            operand = self.from_tree(child)
+            if operand is None:
+                return None
+            operand_list.append(operand)
+        if node.data == '+':
+            result = BladeSum()
+            for operand in operand_list:
+                result = result.add(operand)
+            return result
+        elif node.data == '*' or node.data == '^' or node.data == '.':
+            if len(operand_list) == 0:
+                return BladeSum.scalar(1.0)
+            result = operand_list[0]
+            for operand in operand_list[1:]:
+                if node.data == '*':
+                    result = self.geometric_product(result, operand)
+                elif node.data == '^':
+                    result = result.outer_product(operand)
+                else:
+                    result = self.inner_product(result, operand)
+            return result
+        elif node.data == '-' and len(operand_list) == 2:
+            return operand_list[0].add(operand_list[1], -1.0)
+        elif node.data == '/' and len(operand_list) == 2:
+            inverse = self.inverse(operand_list[1])
+            if inverse is not None:
+                return self.geometric_product(operand_list[0], inverse)
+        elif node.data == 'inv' and len(operand_list) == 1:
+            return self.inverse(operand_list[0])
+        elif node.data == 'rev' and len(operand_list) == 1:
+            return operand_list[0].reverse()
+        return None
+
+    def to_tree(self, blade_sum):
+        term_list = []
+        for blade in sorted(blade_sum.term_map.keys(), key=lambda blade: (len(blade), blade)):
+            polynomial = blade_sum.term_map[blade]
+            for monomial in sorted(polynomial.keys()):
+                factor_list = []
+                if polynomial[monomial] != 1.0:
+                    factor_list.append(MathTreeNode(polynomial[monomial]))
+                for atom in monomial:
+                    if len(atom) == 1:
+                        factor_list.append(MathTreeNode(atom[0]))
+                    else:
+                        factor_list.append(MathTreeNode('.', [MathTreeNode(atom[0]), MathTreeNode(atom[1])]))
+                factor_list += [MathTreeNode(vector) for vector in blade]
+                if len(factor_list) == 0:
+                    term_list.append(MathTreeNode(1.0))
+                elif len(factor_list) == 1:
+                    term_list.append(factor_list[0])
+                else:
+                    term_list.append(MathTreeNode('^' if len(blade) > 1 else '*', factor_list))
+        if len(term_list) == 0:
+            return MathTreeNode(0.0)
+        if len(term_list) == 1:
+            return term_list[0]
+        return MathTreeNode('+', term_list)
+
+    def blade_product(self, product, blade_a, blade_b):
+        # This is the geometric ('*'), outer ('^') or inner ('.') product of two blades, as a term map.
+        if product == '*':
+            return self._blade_geometric_product(blade_a, blade_b)
+        if product == '.':
+            return self._blade_inner_product(blade_a, blade_b)
+        sign, blade = _wedge_blades(blade_a, blade_b)
+        return {blade: {(): float(sign)}} if sign != 0 else {}
+
+    def geometric_product(self, blade_sum_a, blade_sum_b):
+        return self._combine(blade_sum_a, blade_sum_b, self._blade_geometric_product)
+
+    def inner_product(self, blade_sum_a, blade_sum_b):
+        return self._combine(blade_sum_a, blade_sum_b, self._blade_inner_product)
+
+    def inverse(self, blade_sum):
+        # We can only invert a sum whose product with its reverse is a non-zero number.  This covers
+        # numbers, blades and versors with numeric coefficients, which is all we have a closed form for.
+        reverse = blade_sum.reverse()
+        norm = self.geometric_product(blade_sum, reverse).scalar_constant()
+        if norm is None or norm == 0.0:
+            return None
+        return BladeSum().add(reverse, 1.0 / norm)
+
+    def _combine(self, blade_sum_a, blade_sum_b, blade_product):
+        term_map = {}
+        for blade_a, polynomial_a in blade_sum_a.term_map.items():
+            for blade_b, polynomial_b in blade_sum_b.term_map.items():
+                polynomial = _multiply_polynomials(polynomial_a, polynomial_b)
+                for blade, factor in blade_product(blade_a, blade_b).items():
+                    _add_into(term_map, blade, _multiply_polynomials(polynomial, factor))
+        return BladeSum(term_map)
+
+    def _vector_inner_product(self, vector_a, vector_b):
+        # This mirrors what the InnerProductHandler does with a pair of vectors.
+        scalar = self.bilinear_form(vector_a, vector_b)
+        if scalar is None and vector_a > vector_b:
+            scalar = self.bilinear_form(vector_b, vector_a)
+        if scalar is None:
+            return {((min(vector_a, vector_b), max(vector_a, vector_b)),): 1.0}
+        return {(): scalar} if scalar != 0.0 else {}
+
+    def _blade_inner_product(self, blade_a, blade_b):
+        # The inner product with a scalar is just scalar multiplication, as it is in _parse_blade().
+        if len(blade_a) == 0 or len(blade_b) == 0:
+            return {blade_a + blade_b: {(): 1.0}}
+        key = ('.', blade_a, blade_b)
+        term_map = self.product_cache.get(key)
+        if term_map is not None:
+            return term_map
+        term_map = {}
+        if len(blade_a) == 1 and len(blade_b) == 1:
+            _add_into(term_map, (), self._vector_inner_product(blade_a[0], blade_b[0]))
+        elif len(blade_a) == 1 or len(blade_b) == 1:
+            # These are the same expansions made by InnerProductHandler._expand_vector_with_blade().
+            if len(blade_a) == 1:
+                vector, blade, j = blade_a[0], blade_b, 1
+            else:
+                vector, blade, j = blade_b[0], blade_a, 1 if len(blade_a) % 2 == 1 else 0
+            for i in range(len(blade)):
+                polynomial = self._vector_inner_product(vector, blade[i])
+                _add_into(term_map, blade[:i] + blade[i + 1:], polynomial, -1.0 if i % 2 == j else 1.0)
+        else:
+            # Peel a vector off of the larger blade, again as the InnerProductHandler does.
+            if len(blade_a) >= len(blade_b):
+                inner_map = self._blade_inner_product(blade_a[-1:], blade_b)
+                pair_list = [(blade_a[:-1], blade, polynomial) for blade, polynomial in inner_map.items()]
+            else:
+                inner_map = self._blade_inner_product(blade_a, blade_b[:1])
+                pair_list = [(blade, blade_b[1:], polynomial) for blade, polynomial in inner_map.items()]
+            for blade_c, blade_d, polynomial in pair_list:
+                for blade, factor in self._blade_inner_product(blade_c, blade_d).items():
+                    _add_into(term_map, blade, _multiply_polynomials(polynomial, factor))
+        self.product_cache[key] = term_map
+        return term_map
+
+    def _blade_geometric_product(self, blade_a, blade_b):
+        if len(blade_a) == 0 or len(blade_b) == 0:
+            return {blade_a + blade_b: {(): 1.0}}
+        key = ('*', blade_a, blade_b)
+        term_map = self.product_cache.get(key)
+        if term_map is not None:
+            return term_map
+        term_map = {}
+        if len(blade_a) == 1:
+            # For a vector a and blade B, we have aB = a.B + a^B.
+            for blade, polynomial in self._blade_inner_product(blade_a, blade_b).items():
+                _add_into(term_map, blade, polynomial)
+            sign, blade = _wedge_blades(blade_a, blade_b)
+            if sign != 0:
+                _add_into(term_map, blade, {(): 1.0}, float(sign))
+        else:
+            # Writing A = a^R = aR - a.R, we get AB = a(RB) - (a.R)B, and each product here is of lower grade.
+            vector = blade_a[:1]
+            for blade_c, polynomial in self._blade_geometric_product(blade_a[1:], blade_b).items():
+                for blade, factor in self._blade_geometric_product(vector, blade_c).items():
+                    _add_into(term_map, blade, _multiply_polynomials(polynomial, factor))
+            for blade_c, polynomial in self._blade_inner_product(vector, blade_a[1:]).items():
+                for blade, factor in self._blade_geometric_product(blade_c, blade_b).items():
+                    _add_into(term_map, blade, _multiply_polynomials(polynomial, factor), -1.0)
+        self.product_cache[key] = term_map
+        return term_map
@@ -0,0 +1,73 @@
+# evaluator.py
+
+import numpy
+
+from blade_sum import BladeSumCalculator
+
+class CompiledTree(object):
+    # This evaluates an expression for a whole batch of numeric inputs at once.  It is called with a map from
+    # the names of the scalar symbols of the expression to arrays (or numbers) of their values, and returns a map
+    # from each blade (a sorted tuple of vector names, () being the scalar part) to an array of its coefficients.
+    # Inner products of vectors that the bilinear form could not evaluate are also inputs, named like 'a.b'.
+
+    chunk_size = 64
+
+    def __init__(self, blade_sum):
+        self.blade_list = sorted(blade_sum.term_map.keys(), key=lambda blade: (len(blade), blade))
+        atom_set = set()
+        for polynomial in blade_sum.term_map.values():
+            for monomial in polynomial:
+                atom_set.update(monomial)
+        atom_list = sorted(atom_set)
+        self.symbol_list = [atom[0] if len(atom) == 1 else atom[0] + '.' + atom[1] for atom in atom_list]
+        self.source = self._generate_source(blade_sum, atom_list)
+        namespace = {'numpy': numpy}
+        exec(compile(self.source, '<compiled tree>', 'exec'), namespace)
+        self.function = namespace['evaluate']
+
+    def __call__(self, symbol_map):
+        argument_list = []
+        for symbol in self.symbol_list:
+            if symbol not in symbol_map:
+                raise Exception('No value given for symbol: %s' % symbol)
+            argument_list.append(numpy.asarray(symbol_map[symbol], dtype=float))
+        return dict(zip(self.blade_list, self.function(*argument_list)))
+
+    def _generate_source(self, blade_sum, atom_list):
+        # Every distinct monomial is computed once and shared by all the blades that use it.
+        argument_map = {atom: 's%d' % i for i, atom in enumerate(atom_list)}
+        line_list = ['def evaluate(%s):' % ', '.join([argument_map[atom] for atom in atom_list])]
+        line_list.append('    shape = numpy.broadcast_shapes(%s)' % ', '.join(['numpy.shape(%s)' % argument_map[atom] for atom in atom_list]))
+        monomial_map = {}
+        result_list = []
+        for i, blade in enumerate(self.blade_list):
+            polynomial = blade_sum.term_map[blade]
+            term_list = []
+            for monomial in sorted(polynomial.keys()):
+                if len(monomial) == 0:
+                    term_list.append(repr(polynomial[monomial]))
+                    continue
+                if monomial not in monomial_map:
+                    monomial_map[monomial] = 'm%d' % len(monomial_map)
+                    line_list.append('    %s = %s' % (monomial_map[monomial], ' * '.join([argument_map[atom] for atom in monomial])))
+                if polynomial[monomial] == 1.0:
+                    term_list.append(monomial_map[monomial])
+                else:
+                    term_list.append('%r * %s' % (polynomial[monomial], monomial_map[monomial]))
+            # Adding zeros of the batch shape makes sure that even a constant coefficient comes back as an array.
+            # The terms are added a chunk at a time, because Python can't compile a sum of thousands of them.
+            result_list.append('r%d' % i)
+            line_list.append('    r%d = numpy.zeros(shape)' % i)
+            for j in range(0, len(term_list), self.chunk_size):
+                line_list.append('    r%d += %s' % (i, ' + '.join(term_list[j:j + self.chunk_size])))
+        line_list.append('    return [%s]' % ', '.join(result_list))
+        return '\n'.join(line_list) + '\n'
+
+def compile_tree(node, bilinear_form=None):
+    if bilinear_form is None:
+        from manipulators.inner_product_handler import InnerProductHandler
+        bilinear_form = InnerProductHandler().bilinear_form
+    blade_sum = BladeSumCalculator(bilinear_form).from_tree(node)
+    if blade_sum is None:
+        raise Exception('Cannot compile: %s' % node.expression_text())
+    return CompiledTree(blade_sum)
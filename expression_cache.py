@@ -0,0 +1,84 @@
+# expression_cache.py
+
+import sqlite3
+import zlib
+
+from math_tree import MathTreeNodeFactory
+from serialization import canonical_key, dumps, loads
+
+class ExpressionCache(object):
+    # This is an on-disk cache of simplified expressions, kept in an SQLite database, so that it survives
+    # from one run to the next and can be shared between processes.  Entries are keyed by the canonical key of
+    # the tree to simplify, along with the fingerprint of the bilinear form.  Once the compressed results
+    # take up more than the given number of bytes, the least recently used entries are evicted.
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hit_count = 0
+        self.miss_count = 0
+        # Several processes may use the cache at once, so we wait on each other's writes rather than fail.
+        self.connection = sqlite3.connect(path, timeout=30.0)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, result BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_by_last_used ON entries (last_used)')
+        # The cache may have been made with a bigger limit than ours.
+        self._evict()
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def make_key(self, node, bilinear_form, *extra_list):
+        # Only a bilinear form that can identify itself, such as a Metric, can be part of a key.
+        # For any other, we can't know if a cached result still applies, so nothing is cached.
+        # Anything else the result depends on, such as which engine makes it, can be given too.
+        if not hasattr(bilinear_form, 'fingerprint'):
+            return None
+        return canonical_key(node, bilinear_form.fingerprint(), *extra_list)
+
+    # Entries are stamped with a counter rather than the time, and the next value is found in the same statement
+    # that uses it, so that two processes using the cache at once can never take the same value.
+    _next_use_sql = '(SELECT COALESCE(MAX(last_used), 0) + 1 FROM entries)'
+
+    def get(self, key):
+        row = self.connection.execute('SELECT result FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.miss_count += 1
+            return None
+        self.hit_count += 1
+        with self.connection:
+            self.connection.execute('UPDATE entries SET last_used = %s WHERE key = ?' % self._next_use_sql, (key,))
+        # The result comes back hash-consed, and so frozen; see MathTreeNodeFactory.
+        return loads(zlib.decompress(row[0]).decode('utf-8'), MathTreeNodeFactory())
+
+    def put(self, key, node):
+        result = zlib.compress(dumps(node).encode('utf-8'))
+        if len(result) > self.max_bytes:
+            return
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO entries (key, result, size, last_used) VALUES (?, ?, ?, %s)' % self._next_use_sql,
+                                    (key, result, len(result)))
+            self._evict()
+
+    def _evict(self):
+        total_size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        cursor = self.connection.execute('SELECT key, size FROM entries ORDER BY last_used')
+        key_list = []
+        for key, size in cursor:
+            if total_size <= self.max_bytes:
+                break
+            key_list.append((key,))
+            total_size -= size
+        self.connection.executemany('DELETE FROM entries WHERE key = ?', key_list)
+
+    def entry_count(self):
+        return self.connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def total_size(self):
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute('DELETE FROM entries')
@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class Adder(MathTreeManipulator):
+    handled_ops = ['+']
+
     def __init__(self):
         super().__init__()
 
@@ -13,10 +15,9 @@ class Adder(MathTreeManipulator):
                 for j in range(i + 1, len(node.child_list)):
                     child_b = node.child_list[j]
                     if isinstance(child_a.data, float) and isinstance(child_b.data, float):
-                        del node.child_list[j]
-                        del node.child_list[i]
-                        node.child_list.insert(0, MathTreeNode(child_a.data + child_b.data))
-                        return node
-            adjacent_swap_count = self._sort_list(node.child_list, lambda node: len(node.display_text()))
+                        child_list = node.child_list[:i] + node.child_list[i+1:j] + node.child_list[j+1:]
+                        return MathTreeNode('+', [MathTreeNode(child_a.data + child_b.data)] + child_list)
+            child_list = node.child_list[:]
+            adjacent_swap_count = self._sort_list(child_list, lambda node: len(node.display_text()))
             if adjacent_swap_count > 0:
-                return node
\ No newline at end of file
+                return MathTreeNode('+', child_list)
\ No newline at end of file
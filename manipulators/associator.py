@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class Associator(MathTreeManipulator):
+    handled_ops = ['+', '*', '^']
+
     def __init__(self):
         super().__init__()
 
@@ -11,8 +13,4 @@ class Associator(MathTreeManipulator):
         if any([op == node_a.data for op in ['+', '*', '^']]):
             for i, node_b in enumerate(node_a.child_list):
                 if node_b.data == node_a.data:
-                    node = MathTreeNode(node_a.data)
-                    node.child_list += [node_c.copy() for node_c in node_a.child_list[:i]]
-                    node.child_list += [node_c.copy() for node_c in node_b.child_list]
-                    node.child_list += [node_c.copy() for node_c in node_a.child_list[i+1:]]
-                    return node
\ No newline at end of file
+                    return MathTreeNode(node_a.data, node_a.child_list[:i] + node_b.child_list + node_a.child_list[i+1:])
\ No newline at end of file
@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class Collector(MathTreeManipulator):
+    handled_ops = ['+']
+
     def __init__(self):
         super().__init__()
 
@@ -19,19 +21,17 @@ class Collector(MathTreeManipulator):
                         product_b = MathTreeNode('*', [])
                         for joined_child in joined_root.child_list:
                             if joined_child.data[0] is None and joined_child.data[1].calculate_grade() == 0:
-                                product_a.child_list.append(joined_child.data[1])
+                                product_a.append_child(joined_child.data[1])
                             elif joined_child.data[1] is None and joined_child.data[0].calculate_grade() == 0:
-                                product_b.child_list.append(joined_child.data[0])
+                                product_b.append_child(joined_child.data[0])
                             elif not joined_child.is_perfect_join():
                                 break
                         else:
-                            del node.child_list[j]
-                            del node.child_list[i]
-                            node.child_list.append(MathTreeNode('*', [
+                            child_list = node.child_list[:i] + node.child_list[i+1:j] + node.child_list[j+1:]
+                            return MathTreeNode('+', child_list + [MathTreeNode('*', [
                                 MathTreeNode('+', [
                                     product_a,
                                     product_b
                                 ]),
                                 joined_root.intersect_join()
-                            ]))
-                            return self
\ No newline at end of file
+                            ])])
\ No newline at end of file
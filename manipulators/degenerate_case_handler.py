@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class DegenerateCaseHandler(MathTreeManipulator):
+    handled_ops = ['*', '.', '^', '+']
+
     def __init__(self):
         super().__init__()
 
@@ -17,15 +19,13 @@ class DegenerateCaseHandler(MathTreeManipulator):
                 return MathTreeNode(0.0)
             for i, child in enumerate(node.child_list):
                 if child.data == 1.0:
-                    del node.child_list[i]
-                    return node
+                    return MathTreeNode(node.data, node.child_list[:i] + node.child_list[i+1:])
         if node.data == '+':
             if len(node.child_list) == 0:
                 return MathTreeNode(0.0)
             for i, child in enumerate(node.child_list):
                 if child.data == 0.0:
-                    del node.child_list[i]
-                    return node
+                    return MathTreeNode(node.data, node.child_list[:i] + node.child_list[i+1:])
         op_list = ['*', '^']
         for i in range(2):
             if node.data == op_list[i]:
@@ -36,6 +36,5 @@ class DegenerateCaseHandler(MathTreeManipulator):
                                 if node.child_list[k].calculate_grade() != 0:
                                     break
                         else:
-                            node.data = op_list[(i + 1) % 2]
-                            return node
+                            return MathTreeNode(op_list[(i + 1) % 2], node.child_list[:])
                         break
\ No newline at end of file
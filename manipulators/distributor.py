@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class Distributor(MathTreeManipulator):
+    handled_ops = ['.', '^', '*', 'rev']
+
     def __init__(self):
         super().__init__()
     
@@ -14,9 +16,9 @@ class Distributor(MathTreeManipulator):
                 if node_b.data == '+' and len(node_b.child_list) > 1:
                     sum = MathTreeNode('+')
                     for node_c in node_b.child_list:
-                        product = MathTreeNode(node_a.data)
-                        product.child_list += [term.copy() for term in node_a.child_list[:i]]
-                        product.child_list.append(node_c.copy())
-                        product.child_list += [term.copy() for term in node_a.child_list[i+1:]]
-                        sum.child_list.append(product)
+                        product = MathTreeNode(node_a.data, [term.copy() for term in node_a.child_list[:i]])
+                        product.append_child(node_c)
+                        for term in node_a.child_list[i+1:]:
+                            product.append_child(term.copy())
+                        sum.append_child(product)
                     return sum
\ No newline at end of file
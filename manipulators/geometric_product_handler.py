@@ -3,10 +3,17 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class GeometricProductHandler(MathTreeManipulator):
-    def __init__(self):
+    handled_ops = ['*']
+
+    def __init__(self, bilinear_form=None):
         super().__init__()
+        # Given a Metric, products of its basis blades are looked up in its tables.  See Metric.blade_product().
+        self.bilinear_form = bilinear_form
 
     def _manipulate_subtree(self, node):
+        new_node = self._multiply_adjacent_basis_blades(node)
+        if new_node:
+            return new_node
         new_node = self._manipulate_subtree_internal(node, False)
         if new_node:
             return new_node
@@ -66,8 +73,16 @@ class GeometricProductHandler(MathTreeManipulator):
                                             ])
                                         ])
                                     ])
-                            node.child_list += scalar_list_a + scalar_list_b
-                            del node.child_list[i]
-                            del node.child_list[i]
-                            node.child_list.insert(i, sum)
-                            return node
\ No newline at end of file
+                            child_list = node.child_list[:i] + [sum] + node.child_list[i+2:]
+                            return MathTreeNode('*', child_list + scalar_list_a + scalar_list_b)
+
+    def _multiply_adjacent_basis_blades(self, node):
+        if self.bilinear_form is not None and node.data == '*':
+            for i in range(len(node.child_list) - 1):
+                scalar_list_a, vector_list_a = self._parse_blade(node.child_list[i])
+                scalar_list_b, vector_list_b = self._parse_blade(node.child_list[i + 1])
+                if vector_list_a is not None and vector_list_b is not None and len(vector_list_a) > 0 and len(vector_list_b) > 0:
+                    product = self._multiply_basis_blades(self.bilinear_form, '*', vector_list_a, vector_list_b)
+                    if product is not None:
+                        child_list = node.child_list[:i] + [product] + node.child_list[i+2:]
+                        return MathTreeNode('*', child_list + scalar_list_a + scalar_list_b)
@@ -0,0 +1,58 @@
+# like_term_collector.py
+
+from math_tree import MathTreeManipulator, MathTreeNode
+
+class LikeTermCollector(MathTreeManipulator):
+    handled_ops = ['+']
+
+    def __init__(self):
+        super().__init__()
+
+    def _manipulate_subtree(self, node):
+        # Unlike the Collector, we never factor anything out of a sum; we only add up the numeric coefficients
+        # of terms that are otherwise the same.  This can't fight with distribution, and it's done in one pass,
+        # by keying each term on its symbolic scalars and its vectors, using the structural hash of the nodes.
+        term_map = {}
+        key_list = []
+        for child in node.child_list:
+            key = None
+            scalar_list, vector_list = self._parse_blade(child)
+            if scalar_list is None and child.calculate_grade() == 0:
+                # This is the case for an inner product of two vectors, for example.
+                scalar_list, vector_list = [child], []
+            if scalar_list is not None and vector_list is not None:
+                coefficient = 1.0
+                other_list = []
+                for scalar in scalar_list:
+                    if isinstance(scalar.data, float):
+                        coefficient *= scalar.data
+                    else:
+                        other_list.append(scalar)
+                # Scalars commute, so we sort them.  Sorting by hash is enough, because equal nodes hash the same.
+                key = (tuple(sorted(other_list, key=hash)), tuple(vector_list))
+                if key in term_map:
+                    term_map[key][0] += coefficient
+                else:
+                    term_map[key] = [coefficient, other_list, vector_list]
+            key_list.append(key)
+        if len(term_map) == len([key for key in key_list if key is not None]):
+            return None
+        child_list = []
+        for i, key in enumerate(key_list):
+            if key is None:
+                child_list.append(node.child_list[i])
+            elif key in term_map:
+                coefficient, other_list, vector_list = term_map.pop(key)
+                if coefficient != 0.0:
+                    child_list.append(self._make_term(coefficient, other_list, vector_list))
+        if len(child_list) == 0:
+            return MathTreeNode(0.0)
+        return MathTreeNode('+', child_list)
+
+    def _make_term(self, coefficient, other_list, vector_list):
+        factor_list = other_list + vector_list
+        if coefficient != 1.0 or len(factor_list) == 0:
+            factor_list = [MathTreeNode(coefficient)] + factor_list
+        if len(factor_list) == 1:
+            return factor_list[0]
+        return MathTreeNode('^' if len(vector_list) > 1 else '*', factor_list)
@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class Multiplier(MathTreeManipulator):
+    handled_ops = ['*', '.', '^']
+
     def __init__(self):
         super().__init__()
 
@@ -13,18 +15,16 @@ class Multiplier(MathTreeManipulator):
                 for j in range(i + 1, len(node_a.child_list)):
                     child_b = node_a.child_list[j]
                     if isinstance(child_a.data, float) and isinstance(child_b.data, float):
-                        del node_a.child_list[j]
-                        del node_a.child_list[i]
-                        node_a.child_list.insert(0, MathTreeNode(child_a.data * child_b.data))
-                        return node_a
-            for node_b in node_a.child_list:
+                        child_list = node_a.child_list[:i] + node_a.child_list[i+1:j] + node_a.child_list[j+1:]
+                        return MathTreeNode(node_a.data, [MathTreeNode(child_a.data * child_b.data)] + child_list)
+            for j, node_b in enumerate(node_a.child_list):
                 if any([op == node_b.data for op in ['*', '.', '^']]):
                     for i, node_c in enumerate(node_b.child_list):
                         if node_c.calculate_grade() == 0:
-                            del node_b.child_list[i]
-                            node_a.child_list.insert(0, node_c)
-                            return node_a
+                            node_b = MathTreeNode(node_b.data, node_b.child_list[:i] + node_b.child_list[i+1:])
+                            return MathTreeNode(node_a.data, [node_c] + node_a.child_list[:j] + [node_b] + node_a.child_list[j+1:])
             # Here we rely on the stable sort property since the products are not generally commutative.
-            adjacent_swap_count = self._sort_list(node_a.child_list, lambda child: 0 if child.calculate_grade() == 0 else 1)
+            child_list = node_a.child_list[:]
+            adjacent_swap_count = self._sort_list(child_list, lambda child: 0 if child.calculate_grade() == 0 else 1)
             if adjacent_swap_count > 0:
-                return node_a
\ No newline at end of file
+                return MathTreeNode(node_a.data, child_list)
\ No newline at end of file
@@ -3,6 +3,8 @@
 from math_tree import MathTreeManipulator, MathTreeNode
 
 class OuterProductHandler(MathTreeManipulator):
+    handled_ops = ['.', '^', '*']
+
     def __init__(self):
         super().__init__()
 
@@ -19,5 +21,5 @@ class OuterProductHandler(MathTreeManipulator):
             if adjacent_swap_count > 0:
                 new_node = MathTreeNode('^', scalar_list + vector_list)
                 if adjacent_swap_count % 2 == 1:
-                    new_node.child_list.insert(0, MathTreeNode(-1.0))
+                    new_node.insert_child(0, MathTreeNode(-1.0))
                 return new_node
\ No newline at end of file
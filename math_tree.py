@@ -3,99 +3,137 @@
 import copy
 import math
 
-from math2d_vector import Vector
-from math2d_aa_rect import AxisAlignedRectangle
-from math2d_line_segment import LineSegment
-
 class MathTreeNode(object):
-    # Note that no node instance should appear more than once in the tree.
+    # Note that no node instance should appear more than once in the tree, unless it is frozen.  A frozen
+    # node (and so its whole subtree) is never changed in place, which makes it safe to share between trees,
+    # or even between several places in the same tree.  Copying a frozen node is free: we just share it.
+    # Big expansions run into millions of nodes, so nodes have slots rather than a dictionary, and hold only
+    # what the algebra needs.  Where the GUI draws them is kept by the GUI; see tree_animation.py.
+
+    __slots__ = ['child_list', 'data', 'inert_mask', 'subtree_inert_mask', 'inert_engine_id', 'structure_hash',
+                 'cached_grade', 'grade_cached', 'cached_size', 'frozen']
     
     def __init__(self, data, child_list=None):
-        self.position = None
-        self.target_position = None
         self.child_list = [] if child_list is None else child_list
         self.data = data
+        # These are bookkeeping for the RewriteEngine; see rewrite_engine.py.
+        self.inert_mask = 0
+        self.subtree_inert_mask = 0
+        self.inert_engine_id = None
+        self.structure_hash = None
+        self.cached_grade = None
+        self.grade_cached = False
+        self.cached_size = None
+        self.frozen = False
+
+    def freeze(self):
+        if not self.frozen:
+            for child in self.child_list:
+                child.freeze()
+            self.frozen = True
+        return self
+
+    def thaw(self):
+        # Return a private copy of this tree that shares nothing and can be changed in place.
+        return MathTreeNode(self.data, [child.thaw() for child in self.child_list])
+
+    def touch(self):
+        # This must be called whenever the data or child list of this node is changed in place, because
+        # what we cache here describes the whole subtree.  Note that the caches of the ancestors of this
+        # node are also stale after such a change, so whoever made it must touch those as well.
+        self.inert_mask = 0
+        self.subtree_inert_mask = 0
+        self.structure_hash = None
+        self.cached_grade = None
+        self.grade_cached = False
+        self.cached_size = None
+
+    # The following methods change the child list of this node and return the changed node.  That is this
+    # very node, unless it is frozen, in which case it is a frozen copy (and the given child gets frozen too.)
+
+    def replace_child(self, i, new_child):
+        child_list = self.child_list[:] if self.frozen else self.child_list
+        child_list[i] = new_child
+        return self._changed(child_list)
 
-    def is_valid(self):
+    def insert_child(self, i, new_child):
+        child_list = self.child_list[:] if self.frozen else self.child_list
+        child_list.insert(i, new_child)
+        return self._changed(child_list)
+
+    def append_child(self, new_child):
+        return self.insert_child(len(self.child_list), new_child)
+
+    def _changed(self, child_list):
+        if self.frozen:
+            return MathTreeNode(self.data, child_list).freeze()
+        self.touch()
+        return self
+
+    def __hash__(self):
+        # Structurally identical trees hash the same.  Since the hash of a subtree is cached, re-hashing a tree
+        # after a manipulation only costs as much as the nodes touched by that manipulation.
+        if self.structure_hash is None:
+            self.structure_hash = self._calculate_hash([hash(child) for child in self.child_list])
+        return self.structure_hash
+
+    def _calculate_hash(self, child_hash_list):
+        # We hash floats by their hex representation, because, as an int, hash(-1.0) == hash(-2.0).
+        data = (self.data + 0.0).hex() if isinstance(self.data, float) else self.data
+        return hash((data, tuple(child_hash_list)))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, MathTreeNode):
+            return NotImplemented
+        if hash(self) != hash(other) or self.data != other.data or len(self.child_list) != len(other.child_list):
+            return False
+        return all([child_a == child_b for child_a, child_b in zip(self.child_list, other.child_list)])
+
+    def is_valid(self, new_only=False):
+        # Only a frozen node can appear more than once, and only frozen nodes can be under one.  Nor can a frozen
+        # node have been changed in place since its hash was cached, which is what sharing subtrees relies on.
+        # Given new_only, the frozen subtrees are taken to be valid already, and only their roots are checked.
+        # That's the case for a tree a manipulator just built around the nodes of a frozen one.
         node_set = set()
-        for node in self.yield_nodes():
-            key = str(node)
+        node_list = [self]
+        while len(node_list) > 0:
+            node = node_list.pop()
+            key = id(node)
             if key in node_set:
+                if node.frozen:
+                    continue
                 return False
             node_set.add(key)
+            if node.frozen:
+                if not all([child.frozen for child in node.child_list]) or not node._is_unchanged():
+                    return False
+                if new_only:
+                    continue
+            node_list += node.child_list
         return True
 
+    def _is_unchanged(self):
+        # When the hash of a node is cached, so are those of its children, and they must still add up to it.
+        if self.structure_hash is None:
+            return True
+        child_hash_list = [child.structure_hash for child in self.child_list]
+        if any([child_hash is None for child_hash in child_hash_list]):
+            return False
+        return self._calculate_hash(child_hash_list) == self.structure_hash
+
     def size(self):
-        return 1 + sum([child.size() for child in self.child_list])
-
-    def calculate_target_positions(self):
-        self.target_position = Vector(0.0, 0.0)
-        
-        for node in self.child_list:
-            node.calculate_target_positions()
-        
-        rect_list = [node.calculate_subtree_bounding_rectangle(targets=True) for node in self.child_list]
-        padding = 0.5
-        total_width = sum([rect.Width() for rect in rect_list]) + float(len(rect_list) - 1) * padding
-        
-        position = Vector(-total_width / 2.0, -2.0)
-        for i, node in enumerate(self.child_list):
-            rect = rect_list[i]
-            position += Vector(rect.Width() / 2.0, 0.0)
-            node.translate_target_positions(position)
-            position += Vector(rect.Width() / 2.0, 0.0)
-            position += Vector(padding, 0.0)
-    
-    def calculate_subtree_bounding_rectangle(self, targets=True):
-        rect = self.calculate_bounding_rectangle(targets)
-        if len(self.child_list) > 0:
-            for other_node in self.yield_nodes():
-                rect.GrowFor(other_node.calculate_bounding_rectangle(targets))
-        return rect
-    
-    def calculate_bounding_rectangle(self, targets=True):
-        rect = AxisAlignedRectangle()
-        rect.min_point = self.target_position if targets else self.position
-        rect.max_point = self.target_position if targets else self.position
-        rect.min_point -= Vector(0.5, 0.5)
-        rect.max_point += Vector(0.5, 0.5)
-        return rect
-        
+        # Like the hash, the size is cached, so that it's cheap to take after every manipulation.
+        if self.cached_size is None:
+            self.cached_size = 1 + sum([child.size() for child in self.child_list])
+        return self.cached_size
+
     def yield_nodes(self):
         yield self
         for child in self.child_list:
             yield from child.yield_nodes()
     
-    def translate_target_positions(self, translation):
-        self.target_position += translation
-        for node in self.child_list:
-            node.translate_target_positions(translation)
-    
-    def assign_initial_positions(self, parent_position=None):
-        if parent_position is None:
-            parent_position = Vector(0.0, 0.0)
-        if self.position is None:
-            self.position = parent_position
-        for child in self.child_list:
-            child.assign_initial_positions(self.position)
-    
-    def advance_positions(self, lerp_value, eps=1e-2):
-        line_segment = LineSegment(self.position, self.target_position)
-        if line_segment.Length() < eps:
-            self.position = self.target_position
-        else:
-            self.position = line_segment.Lerp(lerp_value)
-        for child in self.child_list:
-            child.advance_positions(lerp_value)
-
-    def is_settled(self):
-        if self.position != self.target_position:
-            return False
-        for child in self.child_list:
-            if not child.is_settled():
-                return False
-        return True
-
     def display_text(self):
         if isinstance(self.data, str):
             return self.data
@@ -117,7 +155,21 @@ class MathTreeNode(object):
     def generate_latex_code(self):
         pass
 
+    # These count how often calculate_grade() is answered from the cache, across all nodes.
+    grade_cache_hits = 0
+    grade_cache_misses = 0
+
     def calculate_grade(self):
+        # The grade of a subtree is asked for over and over again by the manipulators, so we cache it.
+        if self.grade_cached:
+            MathTreeNode.grade_cache_hits += 1
+            return self.cached_grade
+        MathTreeNode.grade_cache_misses += 1
+        self.cached_grade = self._calculate_grade()
+        self.grade_cached = True
+        return self.cached_grade
+
+    def _calculate_grade(self):
         if isinstance(self.data, float) or (isinstance(self.data, str) and self.data[0] == '$'):
             return 0
         elif isinstance(self.data, str) and self.data[0].isalpha() and len(self.child_list) == 0:
@@ -150,6 +202,15 @@ class MathTreeNode(object):
 
     def copy(self):
         return copy.deepcopy(self)
+
+    def __deepcopy__(self, memo):
+        if self.frozen:
+            return self
+        node = MathTreeNode.__new__(MathTreeNode)
+        memo[id(self)] = node
+        for name in MathTreeNode.__slots__:
+            setattr(node, name, copy.deepcopy(getattr(self, name), memo))
+        return node
     
     @staticmethod
     def cast(obj):
@@ -215,41 +276,65 @@ class MathTreeNode(object):
             return node
 
 class MathTreeManipulator(object):
+    # Manipulators list here the node data they can ever do anything with, so that nodes with any other data
+    # need not be offered to them at all.  None means that any node might be manipulated.
+    handled_ops = None
+
     def __init__(self):
         pass
 
     def _manipulate_subtree(self, node):
+        # Note that implementations must never change the given node, or any of its descendants, in place.
+        # Rather, they build and return new nodes around whichever of the old nodes they want to keep.
+        # The old nodes may be moved, but must be copied if they're to appear more than once.
         raise Exception('Method not implemented.')
 
     def manipulate_tree(self, node):
         for i, child in enumerate(node.child_list):
             new_child = self.manipulate_tree(child)
             if new_child is not None:
-                node.child_list[i] = new_child
-                return node
+                return node.replace_child(i, new_child)
+        if self.handled_ops is not None and node.data not in self.handled_ops:
+            return None
         # Notice that we go as deep into the tree before we try to manipulate anything.
         # This is an optimization, because it lets us simplify sub-trees as far as possible
         # before they potentially get copied by distribution or something else that might
         # want to copy an entire sub-tree.
         new_node = self._manipulate_subtree(node)
         if new_node is not None:
+            if node.frozen:
+                new_node.freeze()
             return new_node
     
     def _sort_list(self, given_list, sort_key):
-        # Note that this is a stable sort.
-        adjacent_swap_count = 0
-        if len(given_list) > 1:
-            keep_going = True
-            while keep_going:
-                keep_going = False
-                for i in range(len(given_list) - 1):
-                    key_a = sort_key(given_list[i])
-                    key_b = sort_key(given_list[i + 1])
-                    if key_a > key_b:
-                        given_list[i], given_list[i + 1] = given_list[i + 1], given_list[i]
-                        adjacent_swap_count += 1
-                        keep_going = True
-        return adjacent_swap_count
+        # This is a stable merge sort, and each key is computed only once.  We return the number of inversions
+        # in the given list, which is exactly the number of adjacent swaps that a bubble sort would make, and so
+        # its parity is that of the sorting permutation.
+        key_list = [sort_key(item) for item in given_list]
+        index_list = list(range(len(given_list)))
+        inversion_count = 0
+        width = 1
+        while width < len(index_list):
+            merged_list = []
+            for start in range(0, len(index_list), 2 * width):
+                left_list = index_list[start:start + width]
+                right_list = index_list[start + width:start + 2 * width]
+                i = 0
+                j = 0
+                while i < len(left_list) and j < len(right_list):
+                    if key_list[right_list[j]] < key_list[left_list[i]]:
+                        merged_list.append(right_list[j])
+                        inversion_count += len(left_list) - i
+                        j += 1
+                    else:
+                        merged_list.append(left_list[i])
+                        i += 1
+                merged_list += left_list[i:] + right_list[j:]
+            index_list = merged_list
+            width *= 2
+        if inversion_count > 0:
+            given_list[:] = [given_list[i] for i in index_list]
+        return inversion_count
     
     def _bucket_sort(self, node):
         scalar_list = []
@@ -281,6 +366,34 @@ class MathTreeManipulator(object):
                 return [], [node]
         return None, None
 
+    def _multiply_basis_blades(self, bilinear_form, product, vector_list_a, vector_list_b):
+        # If the given vectors all belong to the basis of a Metric, the product of their blades can be looked up in
+        # its tables, rather than worked out by rewriting.  We return it as a sum of blades, or None if we can't.
+        if not hasattr(bilinear_form, 'blade_product'):
+            return None
+        if not all([len(vector.child_list) == 0 and isinstance(vector.data, str) for vector in vector_list_a + vector_list_b]):
+            return None
+        sign_a, mask_a = bilinear_form.blade_mask([vector.data for vector in vector_list_a])
+        sign_b, mask_b = bilinear_form.blade_mask([vector.data for vector in vector_list_b])
+        if sign_a is None or sign_b is None:
+            return None
+        term_list = []
+        if sign_a != 0 and sign_b != 0:
+            for mask, coefficient in bilinear_form.blade_product(product, mask_a, mask_b):
+                coefficient *= float(sign_a * sign_b)
+                factor_list = [MathTreeNode(vector) for vector in bilinear_form.blade_vectors(mask)]
+                if coefficient != 1.0 or len(factor_list) == 0:
+                    factor_list.insert(0, MathTreeNode(coefficient))
+                if len(factor_list) == 1:
+                    term_list.append(factor_list[0])
+                else:
+                    term_list.append(MathTreeNode('^' if mask & (mask - 1) else '*', factor_list))
+        if len(term_list) == 0:
+            return MathTreeNode(0.0)
+        if len(term_list) == 1:
+            return term_list[0]
+        return MathTreeNode('+', term_list)
+
     def _join_trees(self, root_a, root_b):
         # This might not be the best way to join the trees, but I like the general idea.
         root = MathTreeNode((root_a, root_b))
@@ -325,10 +438,60 @@ class MathTreeManipulator(object):
                     break
         return root
 
+class MathTreeNodeFactory(object):
+    # This factory hash-conses nodes: any two structurally identical subtrees made by it are one and the same
+    # instance, so a tree made this way takes only as much memory as its distinct subtrees do.  Since its nodes
+    # are shared, they're all frozen.  The factory keeps every node it makes, rather than a weak reference to
+    # each, which would cost every node another slot, so make one for each batch of trees and let it go after.
+
+    def __init__(self):
+        self.node_map = {}
+
+    def _make_key(self, data, child_list):
+        # Floats are keyed by their hex representation, so that 0.0 and -0.0 are kept apart, as are 1 and 1.0.
+        return (data.__class__, data.hex() if isinstance(data, float) else data, tuple([id(child) for child in child_list]))
+
+    def create(self, data, child_list=None):
+        # Children that this factory didn't make are interned first, so that they can be keyed by identity.
+        child_list = [] if child_list is None else [self.intern(child) for child in child_list]
+        key = self._make_key(data, child_list)
+        node = self.node_map.get(key)
+        if node is None:
+            node = MathTreeNode(data, child_list).freeze()
+            self.node_map[key] = node
+        return node
+
+    def intern(self, node):
+        # Return the node made by this factory that is structurally identical to the given one.
+        if self.node_map.get(self._make_key(node.data, node.child_list)) is node:
+            return node
+        return self.create(node.data, node.child_list)
+
+class ExpressionSet(object):
+    # This holds the trees that a simplification has been through, so that it can tell when it goes round in a
+    # cycle.  Trees are looked up by structural hash, and only compared in full when the hashes match, so that
+    # a hash collision is never taken for a repeated expression.  Only frozen trees can be added, because they
+    # must stay as they were; since each tree shares all but a few nodes with the one before, this costs little.
+
+    def __init__(self):
+        self.node_list_map = {}
+
+    def add(self, node):
+        if not node.frozen:
+            raise Exception('Only frozen trees can be added to an expression set.')
+        self.node_list_map.setdefault(hash(node), []).append(node)
+
+    def __contains__(self, node):
+        return any([node == other_node for other_node in self.node_list_map.get(hash(node), [])])
+
 def manipulate_tree(node, manipulator_list, max_iters=None, max_tree_size=None, log=print):
+    # We work on the tree frozen, so that every tree we go through can be kept for detecting cycles, and hand back
+    # a private copy of the result, unless the given tree was frozen to begin with.
+    frozen = node.frozen
+    node.freeze()
     iter_count = 0
-    expression_set = set()
-    expression_set.add(node.expression_text())
+    expression_set = ExpressionSet()
+    expression_set.add(node)
     while max_iters is None or iter_count < max_iters:
         iter_count += 1
         for manipulator in manipulator_list:
@@ -343,14 +506,13 @@ def manipulate_tree(node, manipulator_list, max_iters=None, max_tree_size=None,
                     if tree_size > max_tree_size:
                         raise Exception('Tree size (%d) exceeded limit (%d).' % (tree_size, max_tree_size))
                 node = new_node
-                expression_text = node.expression_text()
-                if expression_text in expression_set:
+                if node in expression_set:
                     raise Exception('Expression repeated!')
-                expression_set.add(expression_text)
+                expression_set.add(node)
                 break
         else:
             break
-    return node
+    return node if frozen else node.thaw()
 
 # I believe it worth noting here an alternative to the entire approach taken in this program to the
 # simplifying of a general GA expression.  Forgetting about a free-form tree, create a data-structure
@@ -365,7 +527,9 @@ def manipulate_tree(node, manipulator_list, max_iters=None, max_tree_size=None,
 # want the factored form of a simplified GA expression in terms of the inner product.  I as yet have no
 # idea how to provide this functionality, but our choice of data-structure does not limit us to only GA
 # expressions of the most expanded, simplified form.
-def simplify_tree(node, max_iters=None, bilinear_form=None, log=print):
+_rewrite_engine_map = {}
+
+def make_rewrite_engine(bilinear_form=None):
     from manipulators.adder import Adder
     from manipulators.associator import Associator
     from manipulators.degenerate_case_handler import DegenerateCaseHandler
@@ -373,19 +537,154 @@ def simplify_tree(node, max_iters=None, bilinear_form=None, log=print):
     from manipulators.geometric_product_handler import GeometricProductHandler
     from manipulators.inner_product_handler import InnerProductHandler
     from manipulators.inverter import Inverter
+    from manipulators.like_term_collector import LikeTermCollector
     from manipulators.multiplier import Multiplier
     from manipulators.outer_product_handler import OuterProductHandler
+    from rewrite_engine import RewriteEngine
     # The order of manipulators here has been carefully chosen.
     # In some cases, the order may not matter; in others, very much so.
+    inner_product_handler = InnerProductHandler(bilinear_form)
     manipulator_list = [
-        InnerProductHandler(bilinear_form),
+        inner_product_handler,
         Associator(),
         DegenerateCaseHandler(),
         Inverter(),
-        GeometricProductHandler(),
+        GeometricProductHandler(inner_product_handler.bilinear_form),
         Adder(),
+        LikeTermCollector(),
         Multiplier(),
         OuterProductHandler(),
         Distributor(),
     ]
-    return manipulate_tree(node, manipulator_list, max_iters, log=log)
\ No newline at end of file
+    return RewriteEngine(manipulator_list)
+
+def _get_rewrite_engine(bilinear_form=None):
+    # The engine holds no state between calls, so we only make one for each metric, keyed on its fingerprint.
+    # That also lets a tree keep what the engine learned about it from one call to the next (see RewriteEngine.)
+    # Any other bilinear form gets a new engine every time, since we can't tell if it's the same as before.
+    if bilinear_form is None:
+        key = None
+    elif hasattr(bilinear_form, 'fingerprint'):
+        key = bilinear_form.fingerprint()
+    else:
+        return make_rewrite_engine(bilinear_form)
+    engine = _rewrite_engine_map.get(key)
+    if engine is None:
+        engine = make_rewrite_engine(bilinear_form)
+        _rewrite_engine_map[key] = engine
+    return engine
+
+def start_simplification(node, bilinear_form=None, max_tree_size=None, log=print, stats=None):
+    # This returns a RewriteSession, for simplifying the given tree one step at a time, as the GUI does.
+    # Unlike calling simplify_tree() with max_iters=1 over and over, nothing is forgotten between steps.
+    # Note that this makes the given tree frozen, and that the trees of the session share nodes.
+    return _get_rewrite_engine(bilinear_form).start_session(node, max_tree_size, log=log, stats=stats)
+
+def simplify_tree(node, max_iters=None, bilinear_form=None, log=print, persistent=False, stats=None, cache=None, parallel=None, blade_sum=False, max_tree_size=None, memo=None):
+    engine = _get_rewrite_engine(bilinear_form)
+    bilinear_form = engine.manipulator_list[0].bilinear_form
+    # The given tree is always frozen, because the rewrite engine shares subtrees rather than copy them, and keeps
+    # every tree it goes through (see ExpressionSet.)  In persistent mode, the returned tree shares nodes too,
+    # which is much cheaper, so use thaw() if you need to change it.  Otherwise, it is a private copy.
+    node.freeze()
+    # Only fully simplified results go in the cache (see ExpressionCache), not those of single steps.
+    # The engines needn't all give the same form of the result, so the key says which ones we're using: the
+    # one that falls back to the tree, and the blade-sum engine, if it's tried first.
+    key = None
+    if cache is not None and max_iters is None:
+        mode = 'parallel' if parallel is not None else ('bottom_up' if memo is not None else 'rewrite')
+        if blade_sum:
+            mode = 'blade_sum' if mode == 'rewrite' else 'blade_sum/' + mode
+        key = cache.make_key(node, bilinear_form, mode)
+        if key is not None:
+            new_node = cache.get(key)
+            if new_node is not None:
+                log(cache.__class__.__name__)
+                return new_node if persistent else new_node.thaw()
+    new_node = None
+    # If asked, and we're not asked to go step-by-step, try the blade-sum representation first.  It combines
+    # blades directly, and so it is much faster than growing the tree, but it only knows how to handle
+    # expressions made of the operators it supports; for anything else, we fall back to manipulating the tree.
+    # Note that its result is not always the form the manipulators would reach.  It is a sum over blades in
+    # their canonical order, so terms may come out ordered or collected differently, and a reverse or an
+    # inverse is always multiplied out.  The whole conversion is logged as a single step.
+    if blade_sum and max_iters is None:
+        from blade_sum import BladeSumCalculator
+        new_node = BladeSumCalculator(bilinear_form).simplify(node)
+        if new_node is not None:
+            tree_size = new_node.size()
+            log(BladeSumCalculator.__name__)
+            log('Tree size: %d' % tree_size)
+            if stats is not None:
+                stats.iter_count += 1
+                stats.tree_size_history += [node.size(), tree_size]
+            if max_tree_size is not None:
+                if tree_size > max_tree_size:
+                    raise Exception('Tree size (%d) exceeded limit (%d).' % (tree_size, max_tree_size))
+    # Given a ParallelSimplifier, a full simplification that falls back to the tree is spread over its processes.
+    if new_node is None and max_iters is None and parallel is not None:
+        new_node = parallel.simplify(node, bilinear_form, log=log, max_tree_size=max_tree_size)
+    if new_node is None:
+        # Note that stats (see RewriteStats) only describe the rewrite engine, and so stay empty if it isn't used.
+        # Given a SubtreeMemo, a full simplification goes bottom-up through it, so that a subtree that turns up
+        # again, here or in a later call with the same metric, is only simplified once.  A memo is bound to the
+        # engine that first uses it, so under any other metric, it raises.  See RewriteEngine.manipulate_tree().
+        new_node = engine.manipulate_tree(node, max_iters, max_tree_size, log=log, stats=stats, memo=memo if max_iters is None else None)
+    if key is not None:
+        cache.put(key, new_node)
+    if not persistent and new_node.frozen:
+        new_node = new_node.thaw()
+    return new_node
+
+def build_node(data, operand_list, identity, factory=None):
+    # This makes an n-ary node without copying anything, unlike the operators of MathTreeNode, which copy both
+    # of their operands.  The operands are frozen instead, and so can be shared, both by this node and by any
+    # other made from them.  Any operand that is itself a node of the same kind has its children spliced in.
+    # Rather than a list of operands, one iterable of them may be given.  Numbers and names are cast to nodes.
+    # Given a MathTreeNodeFactory, the node is made by it, so that it shares whatever it can with what else it made.
+    if len(operand_list) == 1 and not isinstance(operand_list[0], (MathTreeNode, str, float, int)):
+        operand_list = list(operand_list[0])
+    child_list = []
+    for operand in operand_list:
+        node = operand.freeze() if isinstance(operand, MathTreeNode) else MathTreeNode.cast(operand)
+        if node.data == data and len(node.child_list) > 0:
+            child_list += node.child_list
+        else:
+            child_list.append(node)
+    if factory is not None:
+        if len(child_list) == 0:
+            return factory.create(identity)
+        if len(child_list) == 1:
+            return factory.intern(child_list[0])
+        return factory.create(data, child_list)
+    if len(child_list) == 0:
+        return MathTreeNode(identity)
+    if len(child_list) == 1:
+        return child_list[0].freeze()
+    return MathTreeNode(data, child_list).freeze()
+
+def make_script_globals():
+    # These are the names that scripts, like those in the scripts folder, can use to build trees.
+    # Given all their operands at once, as in _sum(terms), _sum, _product and _wedge build an expression in time
+    # linear in its size, whereas adding up the terms one at a time with + takes time quadratic in its size.
+    # What they build is hash-consed, so that a big expression made of the same few terms stays small.
+    factory = MathTreeNodeFactory()
+    return {
+        '_n': lambda x: MathTreeNode(x),
+        '_sum': lambda *operand_list: build_node('+', operand_list, 0.0, factory),
+        '_product': lambda *operand_list: build_node('*', operand_list, 1.0, factory),
+        '_wedge': lambda *operand_list: build_node('^', operand_list, 1.0, factory),
+        'inv': lambda x: MathTreeNode('inv', [x]),
+        'rev': lambda x: MathTreeNode('rev', [x]),
+        'e1': MathTreeNode('e1'),
+        'e2': MathTreeNode('e2'),
+        'e3': MathTreeNode('e3'),
+        'no': MathTreeNode('no'),
+        'ni': MathTreeNode('ni'),
+        '_v': lambda x, y, z: MathTreeNode('+', [
+            MathTreeNode('*', [MathTreeNode(x), MathTreeNode('e1')]),
+            MathTreeNode('*', [MathTreeNode(y), MathTreeNode('e2')]),
+            MathTreeNode('*', [MathTreeNode(z), MathTreeNode('e3')])
+        ]),
+        'simplify': simplify_tree
+    }
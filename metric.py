@@ -0,0 +1,142 @@
+# metric.py
+
+import array
+import hashlib
+
+class Metric(object):
+    # A metric interns the names of the basis vectors to indices into a Gram matrix, which holds the inner
+    # product of every pair of basis vectors.  A metric can be used wherever a bilinear form is expected:
+    # calling it with two vector names gives their inner product, or None if it is unknown.
+    # The Gram matrix may be given as a NumPy array or as a list of lists, and is kept as the latter, since it's
+    # only ever read one element at a time, so the simplifier doesn't need NumPy; see the gram_matrix property.
+
+    def __init__(self, basis_list, gram_matrix):
+        self.basis_list = list(basis_list)
+        self.index_map = {name: i for i, name in enumerate(self.basis_list)}
+        if len(self.index_map) != len(self.basis_list):
+            raise Exception('Basis vector names must be unique.')
+        dimension = len(self.basis_list)
+        self.gram_list = [[float(scalar) for scalar in row] for row in gram_matrix]
+        if len(self.gram_list) != dimension or any([len(row) != dimension for row in self.gram_list]):
+            raise Exception('Gram matrix must be %d by %d.' % (dimension, dimension))
+        if any([self.gram_list[i][j] != self.gram_list[j][i] for i in range(dimension) for j in range(i)]):
+            raise Exception('Gram matrix must be symmetric.')
+        # A basis blade is given by a bitmask, in which bit i stands for the basis vector that comes i-th in order
+        # of name, because that's the order the OuterProductHandler puts the vectors of a blade in.
+        self.sorted_basis_list = sorted(self.basis_list)
+        self.bit_map = {name: 1 << i for i, name in enumerate(self.sorted_basis_list)}
+        # These are the multiplication tables of the basis blades, one for each product, filled in as needed.
+        # Each is a dictionary keyed on the pair of bitmasks, rather than a list with room for every pair, so that
+        # it only ever holds the products asked for; there are 4**n pairs in n dimensions.
+        self.cayley_table_map = {}
+
+    def __call__(self, vector_a, vector_b):
+        i = self.index_map.get(vector_a)
+        j = self.index_map.get(vector_b)
+        if i is None or j is None:
+            return None
+        return self.gram_list[i][j]
+
+    @property
+    def gram_matrix(self):
+        import numpy
+        return numpy.array(self.gram_list, dtype=float)
+
+    def dimension(self):
+        return len(self.basis_list)
+
+    def index_of(self, vector):
+        return self.index_map.get(vector)
+
+    def blade_mask(self, vector_list):
+        # This gives the bitmask of the basis blade that is the outer product of the given basis vectors, along
+        # with the sign it takes to put them in order, which is zero if any vector repeats.  If any isn't a basis
+        # vector, then we give None for both.
+        mask = 0
+        sign = 1
+        for vector in vector_list:
+            bit = self.bit_map.get(vector)
+            if bit is None:
+                return None, None
+            if mask & bit:
+                sign = 0
+            # Every vector already in the blade that comes after this one costs a swap.
+            elif bin(mask & ~(bit - 1)).count('1') % 2 == 1:
+                sign = -sign
+            mask |= bit
+        return sign, mask
+
+    def blade_vectors(self, mask):
+        return [name for i, name in enumerate(self.sorted_basis_list) if mask & (1 << i)]
+
+    def blade_product(self, product, mask_a, mask_b):
+        # This gives the geometric ('*'), outer ('^') or inner ('.') product of two basis blades as a tuple of
+        # pairs of a basis blade and its coefficient.  Each product is worked out once, by a BladeSumCalculator,
+        # the first time it's asked for, and after that, it's looked up in a table keyed on the two bitmasks.
+        table = self.cayley_table_map.get(product)
+        if table is None:
+            table = {}
+            self.cayley_table_map[product] = table
+        entry = table.get((mask_a, mask_b))
+        if entry is None:
+            from blade_sum import BladeSumCalculator
+            term_map = BladeSumCalculator(self).blade_product(product, tuple(self.blade_vectors(mask_a)), tuple(self.blade_vectors(mask_b)))
+            # The inner product of every pair of basis vectors is known, so every coefficient is a number.
+            entry = tuple([(self.blade_mask(blade)[1], polynomial[()]) for blade, polynomial in sorted(term_map.items())])
+            table[(mask_a, mask_b)] = entry
+        return entry
+
+    def fingerprint(self):
+        # This identifies the metric across processes and runs, so that it can be part of a cache key.
+        digest = hashlib.sha1()
+        digest.update(self.__class__.__name__.encode('utf-8'))
+        digest.update(','.join(self.basis_list).encode('utf-8'))
+        # These are the same bytes as those of the Gram matrix as a NumPy array of doubles.
+        digest.update(array.array('d', [scalar for row in self.gram_list for scalar in row]).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def diagonal(basis_list, square_list):
+        return Metric(basis_list, [[square if i == j else 0.0 for j in range(len(square_list))] for i, square in enumerate(square_list)])
+
+    @staticmethod
+    def signature(positive, negative=0, zero=0):
+        # The basis vectors are e1, e2, ..., squaring to +1, then -1, then 0, in that order.
+        square_list = [1.0] * positive + [-1.0] * negative + [0.0] * zero
+        return Metric.diagonal(['e%d' % (i + 1) for i in range(len(square_list))], square_list)
+
+    @staticmethod
+    def euclidean(dimension=3):
+        return Metric.signature(dimension)
+
+    @staticmethod
+    def minkowski(dimension=4):
+        # This is the space-time algebra convention: e0 squares to +1, and e1, e2, ... square to -1.
+        return Metric.diagonal(['e%d' % i for i in range(dimension)], [1.0] + [-1.0] * (dimension - 1))
+
+    @staticmethod
+    def conformal():
+        return ConformalMetric()
+
+class ConformalMetric(Metric):
+    # This is the conformal model of 3D Euclidean space, with no and ni being the null vectors representing the
+    # origin and the point at infinity.  Any other vector whose name starts with 'e' is taken to be a Euclidean
+    # vector, and so orthogonal to both no and ni, even though its inner products with other vectors are unknown.
+
+    def __init__(self):
+        super().__init__(['e1', 'e2', 'e3', 'no', 'ni'], [
+            [1.0, 0.0, 0.0, 0.0, 0.0],
+            [0.0, 1.0, 0.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0, 0.0, -1.0],
+            [0.0, 0.0, 0.0, -1.0, 0.0]
+        ])
+
+    def __call__(self, vector_a, vector_b):
+        scalar = super().__call__(vector_a, vector_b)
+        if scalar is not None:
+            return scalar
+        if (vector_a == 'no' or vector_a == 'ni') and vector_b[0] == 'e':
+            return 0.0
+        if (vector_b == 'no' or vector_b == 'ni') and vector_a[0] == 'e':
+            return 0.0
@@ -0,0 +1,107 @@
+# parallel_simplify.py
+
+import multiprocessing
+import os
+import pickle
+
+from math_tree import MathTreeNode, MathTreeNodeFactory, _get_rewrite_engine, simplify_tree, start_simplification
+from serialization import dumps, loads
+
+# Each worker process makes its engine once, when it starts, for the bilinear form its pool was made for.
+_worker_engine = None
+
+def _ignore_log(message):
+    pass
+
+def _init_worker(bilinear_form):
+    global _worker_engine
+    _worker_engine = _get_rewrite_engine(bilinear_form)
+
+def _simplify_chunk(args):
+    # This runs in a worker process.  Trees travel as serialized text, so that each is pickled as one string,
+    # rather than as an object for every node.  What's read through the factory is frozen; see simplify_tree().
+    text, max_tree_size = args
+    return dumps(_worker_engine.manipulate_tree(loads(text, MathTreeNodeFactory()), max_tree_size=max_tree_size, log=_ignore_log))
+
+def _form_key(bilinear_form):
+    # Forms that can identify themselves, such as a Metric, are the same if their fingerprints are.
+    # Any other is only known to be the same as itself.
+    if hasattr(bilinear_form, 'fingerprint'):
+        return bilinear_form.fingerprint()
+    return id(bilinear_form)
+
+class ParallelSimplifier(object):
+    # This spreads the simplification of one big tree over a pool of processes.  Subtrees that don't depend on
+    # each other can each be simplified on their own, and only combining the results needs them all.  We find
+    # such subtrees in two places.  First, the operands of the root are simplified in the pool before the root
+    # itself is touched, as they would be bottom-up, so that expanding them isn't left to this process.  Then
+    # we manipulate the tree here until its root is a sum of at least the given number of summands, hand out the
+    # summands, in chunks of the given size, to the pool, and lastly simplify the sum of what comes back.  By
+    # default, there's a summand for each process, and a few chunks for each process, so that no one process is
+    # left with all the hard summands.  Call close() when done, or use this in a with statement.
+    # The bilinear form is sent to each process once, when the pool starts, so the pool is started over if a
+    # tree is simplified under another form than the last.
+
+    def __init__(self, processes=None, chunk_size=None, min_summand_count=None):
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunk_size = chunk_size
+        self.min_summand_count = self.processes if min_summand_count is None else min_summand_count
+        self.pool = None
+        self.bilinear_form = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self, bilinear_form=None):
+        # The pool is started when first needed, but it can be started ahead of time with this.
+        # A bilinear form of None is the default one, as everywhere else.
+        if bilinear_form is None:
+            bilinear_form = _get_rewrite_engine().manipulator_list[0].bilinear_form
+        if self.pool is not None and _form_key(bilinear_form) != _form_key(self.bilinear_form):
+            self.close()
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(max(1, self.processes), _init_worker, (bilinear_form,))
+            self.bilinear_form = bilinear_form
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.bilinear_form = None
+
+    def simplify(self, node, bilinear_form=None, log=print, max_tree_size=None):
+        # Note that this makes the given tree frozen, and that the returned tree shares nodes.
+        # The bilinear form goes to the other processes when the pool starts, so it must be picklable.  A Metric
+        # is, but a lambda, say, isn't, and then all we can do is simplify the tree in this process.
+        try:
+            pickle.dumps(bilinear_form)
+        except Exception as ex:
+            log('%s: cannot send the bilinear form to other processes (%s), so simplifying in this one.' % (self.__class__.__name__, str(ex)))
+            return simplify_tree(node, bilinear_form=bilinear_form, log=log, persistent=True, max_tree_size=max_tree_size)
+        node.freeze()
+        # A reverse or an inverse is taken apart before what's under it gets simplified; see RewriteEngine.
+        if len(node.child_list) > 1 and node.data != '+' and node.data != 'rev' and node.data != 'inv':
+            log('%s: %d operands of %s' % (self.__class__.__name__, len(node.child_list), node.data))
+            arg_list = [(dumps(child), max_tree_size) for child in node.child_list]
+            node = MathTreeNode(node.data, self._map(arg_list, bilinear_form)).freeze()
+        session = start_simplification(node, bilinear_form, max_tree_size, log=log)
+        while session.node.data != '+' or len(session.node.child_list) < max(2, self.min_summand_count):
+            if session.step() is None:
+                return session.node
+        summand_list = session.node.child_list
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, len(summand_list) // (4 * max(1, self.processes)))
+        arg_list = [(dumps(MathTreeNode('+', summand_list[i:i + chunk_size])), max_tree_size) for i in range(0, len(summand_list), chunk_size)]
+        log('%s: %d summands in %d chunks' % (self.__class__.__name__, len(summand_list), len(arg_list)))
+        return simplify_tree(MathTreeNode('+', self._map(arg_list, bilinear_form)), bilinear_form=bilinear_form, log=log, persistent=True, max_tree_size=max_tree_size)
+
+    def _map(self, arg_list, bilinear_form):
+        # What comes back is read through one factory, so that the results share whatever subtrees they can.
+        factory = MathTreeNodeFactory()
+        return [loads(text, factory) for text in self.start(bilinear_form).map(_simplify_chunk, arg_list)]
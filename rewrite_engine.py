@@ -0,0 +1,310 @@
+# rewrite_engine.py
+
+import collections
+import itertools
+import time
+
+from math_tree import ExpressionSet, MathTreeNode
+
+class RewriteStats(object):
+    # Pass one of these to RewriteEngine.manipulate_tree() to find out where its time goes.  The per-manipulator
+    # lists are in the order of the engine's manipulators.  An attempt is a call to a manipulator's
+    # _manipulate_subtree(), and a hit is an attempt that made a manipulation.  A pass is one walk of the tree
+    # on behalf of one manipulator, and we count the nodes it visits, including those found to be inert.
+
+    def __init__(self):
+        self.manipulator_name_list = []
+        self.attempt_count_list = []
+        self.hit_count_list = []
+        self.seconds_list = []
+        self.pass_list = []
+        self.pass_visit_count = 0
+        self.tree_size_history = []
+        self.iter_count = 0
+        self.validation_seconds = 0.0
+        self.cycle_detection_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def _begin(self, manipulator_list):
+        if len(self.manipulator_name_list) == 0:
+            self.manipulator_name_list = [manipulator.__class__.__name__ for manipulator in manipulator_list]
+            self.attempt_count_list = [0] * len(manipulator_list)
+            self.hit_count_list = [0] * len(manipulator_list)
+            self.seconds_list = [0.0] * len(manipulator_list)
+        elif len(self.manipulator_name_list) != len(manipulator_list):
+            raise Exception('Stats cannot be shared between different engines.')
+
+    def rewrite_count(self):
+        return sum(self.hit_count_list)
+
+    def visit_count(self):
+        return sum([visit_count for i, visit_count in self.pass_list])
+
+    def report(self):
+        line_list = ['%-24s %10s %8s %12s' % ('Manipulator', 'Attempts', 'Hits', 'Seconds')]
+        for i, name in enumerate(self.manipulator_name_list):
+            line_list.append('%-24s %10d %8d %12.6f' % (name, self.attempt_count_list[i], self.hit_count_list[i], self.seconds_list[i]))
+        line_list.append('Iterations: %d, passes: %d, nodes visited: %d' % (self.iter_count, len(self.pass_list), self.visit_count()))
+        if len(self.tree_size_history) > 0:
+            line_list.append('Tree size: %d at first, %d at peak, %d at last' % (
+                self.tree_size_history[0], max(self.tree_size_history), self.tree_size_history[-1]))
+        line_list.append('Validation: %1.6f s, cycle detection: %1.6f s, total: %1.6f s' % (
+            self.validation_seconds, self.cycle_detection_seconds, self.total_seconds))
+        return '\n'.join(line_list)
+
+class SubtreeMemo(object):
+    # This remembers the fully simplified form of subtrees, keyed structurally, and forgets the least recently
+    # used of them once it holds more than the given number.  See RewriteEngine.manipulate_tree().
+    # All the subtrees it holds, both keys and values, are frozen, so they can be shared wherever they're needed.
+    # What's simplified by one engine, with its manipulators and metric, needn't be by another, so a memo only
+    # ever serves the engine that first used it.
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.result_map = collections.OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+        self.engine_id = None
+
+    def _begin(self, engine):
+        if self.engine_id is None:
+            self.engine_id = engine.engine_id
+        elif self.engine_id != engine.engine_id:
+            raise Exception('A memo cannot be shared between different engines.')
+
+    def get(self, node):
+        result = self.result_map.get(node)
+        if result is None:
+            self.miss_count += 1
+            return None
+        self.hit_count += 1
+        self.result_map.move_to_end(node)
+        return result
+
+    def put(self, node, result):
+        self.result_map[node] = result
+        self.result_map.move_to_end(node)
+        while len(self.result_map) > self.max_size:
+            self.result_map.popitem(last=False)
+
+class RewriteEngine(object):
+    # This engine makes exactly the same manipulations, in exactly the same order, as manipulate_tree() does.
+    # The difference is that every node remembers which manipulators are known not to apply to it, and which
+    # are known not to apply anywhere in its subtree.  Whether a manipulator applies to a node depends only on
+    # the subtree rooted at that node, so after a manipulation, only the manipulated node and its ancestors
+    # ever need to be offered to the manipulators again; every other subtree is skipped in constant time.
+    # Note that this relies on manipulators never changing nodes in place.  See MathTreeManipulator.
+    # What a node remembers is kept from one call to the next, and only forgotten when another engine visits it,
+    # because what's inert to one set of manipulators, or under one metric, may not be to another.
+
+    _engine_id_counter = itertools.count(1)
+
+    def __init__(self, manipulator_list):
+        self.manipulator_list = manipulator_list
+        self.engine_id = next(RewriteEngine._engine_id_counter)
+        # For each kind of node data, make a mask of the manipulators that never handle it.
+        # Nodes are then only offered to the manipulators that declare they can handle them.
+        self.unhandled_mask_map = {}
+        self.default_unhandled_mask = 0
+        for i, manipulator in enumerate(manipulator_list):
+            if manipulator.handled_ops is not None:
+                self.default_unhandled_mask |= 1 << i
+                for op in manipulator.handled_ops:
+                    self.unhandled_mask_map[op] = 0
+        for op in self.unhandled_mask_map:
+            for i, manipulator in enumerate(manipulator_list):
+                if manipulator.handled_ops is not None and op not in manipulator.handled_ops:
+                    self.unhandled_mask_map[op] |= 1 << i
+
+    def manipulate_tree(self, node, max_iters=None, max_tree_size=None, log=print, stats=None, memo=None):
+        # Statistics are only gathered if a RewriteStats is given, and otherwise cost next to nothing.
+        # If a SubtreeMemo is given, the tree is simplified bottom-up instead: each subtree is simplified in turn,
+        # once its children have been, and what's learned is kept in the memo, to be reused wherever the same
+        # subtree turns up again, even in later calls with this engine, though never with another.  This ignores
+        # max_iters.  Note that, since the children of a node are simplified before it is, the result need not be
+        # in the same form as without a memo.
+        if stats is not None:
+            stats._begin(self.manipulator_list)
+            start_time = time.perf_counter()
+        grade_cache_hits = MathTreeNode.grade_cache_hits
+        grade_cache_misses = MathTreeNode.grade_cache_misses
+        if memo is None:
+            node = self._run(node, max_iters, max_tree_size, log, stats)
+        else:
+            memo._begin(self)
+            node = self._simplify_bottom_up(node.freeze(), max_tree_size, log, stats, memo)
+        if stats is not None:
+            stats.total_seconds += time.perf_counter() - start_time
+        hits = MathTreeNode.grade_cache_hits - grade_cache_hits
+        total = hits + MathTreeNode.grade_cache_misses - grade_cache_misses
+        if total > 0:
+            log('Grade cache hit rate: %1.1f%% (%d of %d)' % (100.0 * hits / total, hits, total))
+        return node
+
+    def _simplify_bottom_up(self, node, max_tree_size, log, stats, memo):
+        result = memo.get(node)
+        if result is not None:
+            return result
+        # A reverse or an inverse is taken apart by the Inverter before what's under it gets simplified, and can't
+        # be once that's been turned into a sum, so those are simplified whole, as they would be without a memo.
+        if node.data == 'rev' or node.data == 'inv':
+            child_list = node.child_list
+        else:
+            child_list = [self._simplify_bottom_up(child, max_tree_size, log, stats, memo) for child in node.child_list]
+        if all([new_child is child for new_child, child in zip(child_list, node.child_list)]):
+            new_node = node
+        else:
+            new_node = MathTreeNode(node.data, child_list)
+        # The children are fully simplified, and so known to be inert, so this only ever revisits what's new.
+        result = self._run(new_node, None, max_tree_size, log, stats).freeze()
+        memo.put(node, result)
+        memo.put(result, result)
+        return result
+
+    def start_session(self, node, max_tree_size=None, log=print, stats=None):
+        # This is for simplifying a tree one step at a time; see RewriteSession.
+        if stats is not None:
+            stats._begin(self.manipulator_list)
+        return RewriteSession(self, node, max_tree_size, log, stats)
+
+    def _run(self, node, max_iters, max_tree_size, log, stats):
+        session = RewriteSession(self, node, max_tree_size, log, stats)
+        session.run(max_iters)
+        return session.node
+
+    def _manipulate_tree(self, node, index, manipulator, stats=None):
+        # This is MathTreeManipulator.manipulate_tree(), except that it skips what is known to be inert.
+        bit = 1 << index
+        if stats is not None:
+            stats.pass_visit_count += 1
+        if node.inert_engine_id != self.engine_id:
+            node.inert_mask = 0
+            node.subtree_inert_mask = 0
+            node.inert_engine_id = self.engine_id
+        if node.subtree_inert_mask & bit:
+            return None
+        # What we return is the new node, along with the path to the manipulated node.  The path is a list of child
+        # indices, built in reverse order as we come back up the tree.
+        for i, child in enumerate(node.child_list):
+            result = self._manipulate_tree(child, index, manipulator, stats)
+            if result is not None:
+                result[1].append(i)
+                return node.replace_child(i, result[0]), result[1]
+        unhandled_mask = self.unhandled_mask_map.get(node.data, self.default_unhandled_mask)
+        if not (node.inert_mask | unhandled_mask) & bit:
+            if stats is None:
+                new_node = manipulator._manipulate_subtree(node)
+            else:
+                attempt_time = time.perf_counter()
+                new_node = manipulator._manipulate_subtree(node)
+                stats.seconds_list[index] += time.perf_counter() - attempt_time
+                stats.attempt_count_list[index] += 1
+                if new_node is not None:
+                    stats.hit_count_list[index] += 1
+            if new_node is not None:
+                # The rest of the tree was checked when it was made, so only what the manipulator built is checked here.
+                if stats is not None:
+                    validation_time = time.perf_counter()
+                if not new_node.is_valid(new_only=True):
+                    raise Exception('Manipulated tree is not valid!')
+                if stats is not None:
+                    stats.validation_seconds += time.perf_counter() - validation_time
+                if node.frozen:
+                    new_node.freeze()
+                return new_node, []
+            node.inert_mask |= bit
+        node.subtree_inert_mask |= bit
+        return None
+
+class RewriteCancelled(Exception):
+    # A RewriteSession raises this from step() when its cancel event is set.  Nothing has been changed by then.
+    pass
+
+class RewriteStep(object):
+    # This describes one manipulation made by a RewriteSession.  The path is the list of child indices leading
+    # from the root to the node that was replaced, so an empty path means that the root itself was replaced.
+
+    def __init__(self, manipulator_name, node, path, tree_size):
+        self.manipulator_name = manipulator_name
+        self.node = node
+        self.path = path
+        self.tree_size = tree_size
+
+class RewriteSession(object):
+    # A session simplifies a tree one manipulation at a time, keeping everything the engine knows between
+    # steps, so that each step costs no more than it would in a full simplification.  In particular, a
+    # repeated expression is detected anywhere in the session, not just within one call.  The current tree
+    # is always the node member.  Iterating over a session takes steps until there are none left to take.
+    # Note that the given tree is frozen, so that every tree the session goes through stays as it was.
+    # If the cancel_event member is set to a threading.Event, then setting that from another thread interrupts the
+    # step underway, between the manipulators it tries, rather than only once it's done.
+
+    def __init__(self, engine, node, max_tree_size=None, log=print, stats=None):
+        self.engine = engine
+        self.node = node.freeze()
+        self.max_tree_size = max_tree_size
+        self.log = log
+        self.stats = stats
+        self.cancel_event = None
+        self.step_count = 0
+        self.finished = False
+        self.expression_set = ExpressionSet()
+        self.expression_set.add(node)
+        if stats is not None:
+            stats.tree_size_history.append(node.size())
+
+    def __iter__(self):
+        while True:
+            step = self.step()
+            if step is None:
+                break
+            yield step
+
+    def run(self, max_steps=None):
+        # Take up to the given number of steps, or as many as it takes, if None, and return them.
+        step_list = []
+        while max_steps is None or len(step_list) < max_steps:
+            step = self.step()
+            if step is None:
+                break
+            step_list.append(step)
+        return step_list
+
+    def step(self):
+        # Make the next manipulation, and return a RewriteStep describing it, or None if the tree is simplified.
+        if self.finished:
+            return None
+        stats = self.stats
+        log = self.log
+        if stats is not None:
+            stats.iter_count += 1
+        for i, manipulator in enumerate(self.engine.manipulator_list):
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise RewriteCancelled()
+            result = self.engine._manipulate_tree(self.node, i, manipulator, stats)
+            if stats is not None:
+                stats.pass_list.append((i, stats.pass_visit_count))
+                stats.pass_visit_count = 0
+            if result is not None:
+                new_node, path = result
+                log(manipulator.__class__.__name__)
+                tree_size = new_node.size()
+                if stats is not None:
+                    stats.tree_size_history.append(tree_size)
+                log('Tree size: %d' % tree_size)
+                if self.max_tree_size is not None:
+                    if tree_size > self.max_tree_size:
+                        raise Exception('Tree size (%d) exceeded limit (%d).' % (tree_size, self.max_tree_size))
+                if stats is not None:
+                    cycle_detection_time = time.perf_counter()
+                if new_node in self.expression_set:
+                    raise Exception('Expression repeated!')
+                self.expression_set.add(new_node)
+                if stats is not None:
+                    stats.cycle_detection_seconds += time.perf_counter() - cycle_detection_time
+                self.node = new_node
+                self.step_count += 1
+                path.reverse()
+                return RewriteStep(manipulator.__class__.__name__, new_node, path, tree_size)
+        self.finished = True
+        return None
@@ -0,0 +1,216 @@
+# serialization.py
+
+import hashlib
+import json
+import re
+
+from math_tree import MathTreeNode, MathTreeNodeFactory
+
+# A tree is serialized as a flat JSON list holding, for each node in pre-order, its data and then its number
+# of children.  Being flat, this is compact, and it can be written and read without any recursion, so there
+# is no limit on the depth of the tree.  Since JSON keeps strings and numbers apart, so do we.
+
+# The same list can also be written to, and read from, a file a little at a time, so that neither end ever needs
+# the whole text in memory at once.
+
+# Given a MathTreeNodeFactory, a tree is read back hash-consed, and so frozen, which for a big simplified
+# expression, with the same symbols and products all over, takes much less memory.
+
+def _yield_items(node):
+    node_list = [node]
+    while len(node_list) > 0:
+        node = node_list.pop()
+        if not isinstance(node.data, (str, float, int)):
+            raise Exception('Cannot serialize node data: %s' % str(node.data))
+        yield node.data
+        yield len(node.child_list)
+        node_list += reversed(node.child_list)
+
+def _build_tree(item_iter, factory=None):
+    # Each entry of the stack is the data of a node still waiting on some of its children, how many it has, and
+    # those made so far.  A node is only made once all its children are, so that a factory can hash-cons it.
+    make_node = MathTreeNode if factory is None else factory.create
+    root = None
+    stack = []
+    for data in item_iter:
+        child_count = next(item_iter, None)
+        if not isinstance(data, (str, float, int)) or not isinstance(child_count, int) or child_count < 0:
+            raise Exception('Malformed serialized tree.')
+        if root is not None:
+            raise Exception('Malformed serialized tree.')
+        if child_count > 0:
+            stack.append((data, child_count, []))
+            continue
+        node = make_node(data)
+        # Whatever node completes the children of its parent completes the parent too.
+        while len(stack) > 0:
+            parent_data, parent_child_count, child_list = stack[-1]
+            child_list.append(node)
+            if len(child_list) < parent_child_count:
+                break
+            stack.pop()
+            node = make_node(parent_data, child_list)
+        else:
+            root = node
+    if root is None or len(stack) > 0:
+        raise Exception('Malformed serialized tree.')
+    return root
+
+def to_list(node):
+    return list(_yield_items(node))
+
+def from_list(item_list, factory=None):
+    if not isinstance(item_list, list):
+        raise Exception('Malformed serialized tree.')
+    return _build_tree(iter(item_list), factory)
+
+def dumps(node):
+    return json.dumps(to_list(node), separators=(',', ':'))
+
+def loads(text, factory=None):
+    return from_list(json.loads(text), factory)
+
+def dump(node, handle, chunk_size=4096):
+    # What's written is exactly what dumps() returns.
+    handle.write('[')
+    item_list = []
+    first = True
+    for item in _yield_items(node):
+        item_list.append(json.dumps(item))
+        if len(item_list) == chunk_size:
+            handle.write(('' if first else ',') + ','.join(item_list))
+            item_list = []
+            first = False
+    if len(item_list) > 0:
+        handle.write(('' if first else ',') + ','.join(item_list))
+    handle.write(']')
+
+def load(handle, chunk_size=65536, factory=None):
+    return _build_tree(_read_items(handle, chunk_size), factory)
+
+def _read_items(handle, chunk_size):
+    # We decode the items of the list one at a time, reading another chunk whenever we run out of text.  Since
+    # an item cut off by the end of a chunk, such as a number, can look complete, we also read on unless an
+    # item is followed by what must follow it.
+    decoder = json.JSONDecoder()
+    text = ''
+    i = 0
+    at_end = False
+    state = 'start'
+    while True:
+        while i < len(text) and text[i].isspace():
+            i += 1
+        item_end = None
+        complete = True
+        if i < len(text) and (state == 'first' or state == 'item') and text[i] != ']':
+            try:
+                item, item_end = decoder.raw_decode(text, i)
+            except ValueError:
+                item_end = len(text)
+            j = item_end
+            while j < len(text) and text[j].isspace():
+                j += 1
+            complete = j < len(text) and (text[j] == ',' or text[j] == ']')
+        if not at_end and (i == len(text) or not complete):
+            chunk = handle.read(chunk_size)
+            at_end = len(chunk) == 0
+            text = text[i:] + chunk
+            i = 0
+            continue
+        if i == len(text):
+            if state == 'end':
+                return
+            raise Exception('Malformed serialized tree.')
+        if state == 'start' and text[i] == '[':
+            state = 'first'
+        elif state == 'first' and text[i] == ']':
+            state = 'end'
+        elif item_end is not None:
+            if not complete:
+                raise Exception('Malformed serialized tree.')
+            yield item
+            i = item_end
+            state = 'separator'
+            continue
+        elif state == 'separator' and text[i] == ',':
+            state = 'item'
+        elif state == 'separator' and text[i] == ']':
+            state = 'end'
+        else:
+            raise Exception('Malformed serialized tree.')
+        i += 1
+
+def canonical_key(node, *extra_list):
+    # Unlike hash(node), which changes from one process to the next, this identifies a tree across processes
+    # and runs, and so is what persistent caches must be keyed on.  Anything else the result depends on,
+    # such as the fingerprint of the bilinear form, can be mixed in too.
+    digest = hashlib.sha1()
+    digest.update(dumps(node).encode('utf-8'))
+    for extra in extra_list:
+        digest.update(b'\0')
+        digest.update(str(extra).encode('utf-8'))
+    return digest.hexdigest()
+
+# What follows reads back what MathTreeNode.expression_text() writes, in time linear in the length of the text,
+# and again without recursion.  A single-character operator is written between its operands, inside parentheses,
+# and anything else is written as a function call.  An operator with no operands is written as just itself, such
+# as + for an empty sum, and we also take empty parentheses to be an empty sum.  Note that parentheses around a
+# single operand are taken to be just that, that inf and nan are taken to be numbers, and that expression_text()
+# rounds numbers to two places, so for an exact copy of a tree, use dumps() instead.
+
+_term_pattern = re.compile(r'\s*(?:(-?(?:(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?|(?:inf|nan)(?![^\s()+\-*/^.,])))|([^\s()+\-*/^.,]+)(\(?)|(\()|([+\-*/^.]))')
+_operator_pattern = re.compile(r'\s*([+\-*/^.,)])')
+_empty_group_pattern = re.compile(r'\s*\)')
+
+def parse_expression_text(text):
+    # Each entry of the stack is a list of the function name, or None if it's just parentheses, the operator
+    # between the operands, once we've seen it, and the operands so far.
+    stack = []
+    i = 0
+    expect_term = True
+    while True:
+        if expect_term:
+            match = _term_pattern.match(text, i)
+            if match is None:
+                raise Exception('Expected an operand at position %d of expression text.' % i)
+            i = match.end()
+            number, name, call, paren, operator = match.groups()
+            if paren is not None or call:
+                empty_match = _empty_group_pattern.match(text, i)
+                if empty_match is None:
+                    stack.append([name, None, []])
+                    continue
+                i = empty_match.end()
+                node = MathTreeNode('+' if name is None else name)
+            elif number is not None:
+                node = MathTreeNode(float(number))
+            else:
+                node = MathTreeNode(name if operator is None else operator)
+        else:
+            match = _operator_pattern.match(text, i)
+            if match is None or len(stack) == 0:
+                raise Exception('Expected an operator at position %d of expression text.' % i)
+            i = match.end()
+            operator = match.group(1)
+            name, frame_operator, child_list = stack[-1]
+            if operator == ')':
+                stack.pop()
+                if name is not None:
+                    node = MathTreeNode(name, child_list)
+                elif frame_operator is not None:
+                    node = MathTreeNode(frame_operator, child_list)
+                else:
+                    node = child_list[0]
+            elif (operator == ',') != (name is not None) or (frame_operator is not None and operator != frame_operator):
+                raise Exception('Unexpected "%s" at position %d of expression text.' % (operator, i - 1))
+            else:
+                stack[-1][1] = operator
+                expect_term = True
+                continue
+        if len(stack) > 0:
+            stack[-1][2].append(node)
+            expect_term = False
+        elif len(text[i:].strip()) > 0:
+            raise Exception('Unexpected text at position %d of expression text.' % i)
+        else:
+            return node
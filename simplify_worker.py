@@ -0,0 +1,95 @@
+# simplify_worker.py
+
+import threading
+import time
+import traceback
+
+from PyQt5 import QtCore
+from math_tree import start_simplification
+from rewrite_engine import RewriteCancelled
+
+class SimplifyWorker(QtCore.QObject):
+    # This simplifies trees on a thread of its own, so that the GUI stays responsive however long a manipulation
+    # takes.  It is given the tree along with an identifier for it, and it keeps one RewriteSession going for as
+    # long as the identifier stays the same, so that repeated expressions are caught across runs.  The session
+    # works on a frozen copy of the given tree, and what's sent back are private copies of its current tree, so
+    # the GUI is free to lay those out and animate them while we carry on.
+
+    snapshot_signal = QtCore.pyqtSignal(object, int)
+    finished_signal = QtCore.pyqtSignal(str, int)
+    error_signal = QtCore.pyqtSignal(str)
+
+    # We send back no more than one snapshot per this many seconds, other than the last one.
+    snapshot_interval = 0.05
+
+    def __init__(self):
+        super().__init__()
+        self.tree_id = None
+        self.session = None
+        # Each run has a cancel event of its own, made when the run is asked for, so that a cancel can't be lost
+        # while the run is still waiting its turn on the worker thread.
+        self.cancel_event_set = set()
+        self.cancel_lock = threading.Lock()
+
+    def make_cancel_event(self):
+        # Call this from the thread asking for a run, and pass what it returns along to run().
+        cancel_event = threading.Event()
+        with self.cancel_lock:
+            self.cancel_event_set.add(cancel_event)
+        return cancel_event
+
+    def cancel(self):
+        # This may be called from any thread, and cancels every run asked for so far, whether it has started or not.
+        # A step underway is interrupted between the manipulators it tries, but not in the middle of a manipulation.
+        with self.cancel_lock:
+            for cancel_event in self.cancel_event_set:
+                cancel_event.set()
+
+    @QtCore.pyqtSlot(object, int, int, float, int, object)
+    def run(self, root_node, tree_id, max_steps, time_budget, max_tree_size, cancel_event):
+        # Zero means no limit for each of the budgets.
+        try:
+            if self.session is None or self.tree_id != tree_id:
+                self.session = start_simplification(root_node.thaw(), log=self._ignore_log)
+                self.tree_id = tree_id
+            session = self.session
+            session.max_tree_size = max_tree_size if max_tree_size > 0 else None
+            session.cancel_event = cancel_event
+            start_time = time.perf_counter()
+            snapshot_time = start_time
+            step_count = 0
+            sent_count = 0
+            reason = 'Simplified.'
+            while True:
+                if cancel_event.is_set():
+                    reason = 'Cancelled.'
+                    break
+                if time_budget > 0.0 and time.perf_counter() - start_time > time_budget:
+                    reason = 'Time budget of %g seconds used up.' % time_budget
+                    break
+                if max_steps > 0 and step_count >= max_steps:
+                    reason = ''
+                    break
+                try:
+                    if session.step() is None:
+                        break
+                except RewriteCancelled:
+                    reason = 'Cancelled.'
+                    break
+                step_count += 1
+                if time.perf_counter() - snapshot_time >= self.snapshot_interval:
+                    self.snapshot_signal.emit(session.node.thaw(), tree_id)
+                    snapshot_time = time.perf_counter()
+                    sent_count = step_count
+            if sent_count < step_count:
+                self.snapshot_signal.emit(session.node.thaw(), tree_id)
+            self.finished_signal.emit(reason, tree_id)
+        except Exception as ex:
+            self.error_signal.emit('ERROR: ' + str(ex) + '\n\n' + traceback.format_exc())
+            self.finished_signal.emit('Failed.', tree_id)
+        finally:
+            with self.cancel_lock:
+                self.cancel_event_set.discard(cancel_event)
+
+    def _ignore_log(self, message):
+        pass
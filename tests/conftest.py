@@ -0,0 +1,23 @@
+# conftest.py
+
+import glob
+import os
+import sys
+
+# The modules of this repository live at its top level, rather than in a package.
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from math_tree import make_script_globals
+
+script_path_list = sorted(glob.glob(os.path.join(repo_dir, 'scripts', '*.py')), key=lambda path: (len(path), path))
+
+def load_script(path):
+    # This builds the tree a script assigns to root, just as the GUI does.
+    locals_dict = {}
+    with open(path, 'r') as handle:
+        exec(handle.read(), make_script_globals(), locals_dict)
+    return locals_dict['root']
+
+def ignore_log(message):
+    pass
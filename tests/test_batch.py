@@ -0,0 +1,53 @@
+# test_batch.py
+
+import json
+import os
+import signal
+
+import pytest
+
+import batch
+from conftest import script_path_list
+
+def _run(tmp_path, line_list, *option_list):
+    input_path = os.path.join(str(tmp_path), 'input.jsonl')
+    output_path = os.path.join(str(tmp_path), 'output.jsonl')
+    with open(input_path, 'w') as handle:
+        handle.write('\n'.join(line_list) + '\n')
+    exit_code = batch.main(['--jsonl', input_path, '--output', output_path] + list(option_list))
+    with open(output_path, 'r') as handle:
+        return exit_code, [json.loads(line) for line in handle]
+
+def test_results_in_order(tmp_path):
+    line_list = [json.dumps('e1*e2'), json.dumps({'id': 'a', 'text': '(e1*e1)'}), json.dumps({'tree': ['^', 2, 'e2', 0, 'e1', 0]})]
+    exit_code, result_list = _run(tmp_path, line_list, '--processes', '2', '--trees')
+    assert exit_code == 0
+    assert [result['id'] for result in result_list] == [1, 'a', 3]
+    assert [result['result'] for result in result_list] == ['(e1^e2)', '1.00', '(-1.00^e1^e2)']
+    assert result_list[2]['tree'] == ['^', 3, -1.0, 0, 'e1', 0, 'e2', 0]
+
+def test_malformed_lines(tmp_path):
+    # A line that can't be read fails on its own, and every other line still gets its result.
+    line_list = [json.dumps('e1*e1'), 'not json', json.dumps({'id': 'x', 'foo': 1}), json.dumps([1, 2]), json.dumps('e2*e2')]
+    exit_code, result_list = _run(tmp_path, line_list, '--processes', '1')
+    assert exit_code == 1
+    assert [result['id'] for result in result_list] == [1, 2, 'x', 4, 5]
+    assert [('error' in result) for result in result_list] == [False, True, True, True, False]
+    assert result_list[1]['error'].startswith('Line 2 is not JSON')
+    assert result_list[4]['result'] == '1.00'
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='needs POSIX interval timers')
+def test_timeout_replaces_worker(tmp_path):
+    # The worker that times out exits, so with a single process, the jobs after it can only finish on its replacement.
+    slow_job = {'id': 'slow', 'code': 'from benchmark import _make_point_product\nroot = _make_point_product(3)'}
+    line_list = [json.dumps(slow_job), json.dumps('e1*e2'), json.dumps(slow_job), json.dumps('no*ni')]
+    exit_code, result_list = _run(tmp_path, line_list, '--processes', '1', '--timeout', '0.2')
+    assert exit_code == 1
+    assert [result.get('error') for result in result_list] == ['Timed out after 0.2 seconds.', None, 'Timed out after 0.2 seconds.', None]
+    assert result_list[1]['result'] == '(e1^e2)'
+
+def test_scripts(tmp_path):
+    output_path = os.path.join(str(tmp_path), 'output.jsonl')
+    assert batch.main(script_path_list[:3] + ['--output', output_path, '--processes', '2', '--max-tree-size', '1000']) == 0
+    with open(output_path, 'r') as handle:
+        assert [json.loads(line)['id'] for line in handle] == script_path_list[:3]
@@ -0,0 +1,72 @@
+# test_benchmark.py
+
+import json
+import os
+
+import benchmark
+from math_tree import MathTreeNode
+
+def _threshold_map(threshold):
+    return {'seconds': threshold, 'rewrite_count': 0.0, 'peak_tree_size': 0.0, 'peak_memory': threshold}
+
+def test_compare_results():
+    baseline = {
+        'a/tree': {'seconds': 1.0, 'rewrite_count': 10, 'peak_tree_size': 50},
+        'b/tree': {'seconds': 0.0005, 'rewrite_count': 10},
+        'c/tree': {'seconds': 1.0},
+        'd/tree': {'seconds': 1.0, 'error': 'Too big.'},
+    }
+    results = {
+        'a/tree': {'seconds': 1.2, 'rewrite_count': 11, 'peak_tree_size': 50},
+        'b/tree': {'seconds': 0.0009, 'rewrite_count': 10},
+        'c/tree': {'seconds': 0.5, 'error': 'Too big.'},
+        'd/tree': {'seconds': 5.0, 'error': 'Too big.'},
+        'e/tree': {'seconds': 100.0},
+    }
+    message_list = []
+    regression_list = benchmark.compare_results(results, baseline, _threshold_map(0.25), log=message_list.append)
+    # A time under the noise floor doesn't count, nor does a workload that failed before, nor one missing from the baseline.
+    assert regression_list == [
+        'a/tree: rewrite_count went from 10 to 11',
+        'c/tree: now fails (Too big.)',
+        'd/tree: seconds went from 1 to 5',
+    ]
+    assert message_list == ['REGRESSION ' + regression for regression in regression_list]
+    assert benchmark.compare_results(results, baseline, {'seconds': 10.0}, log=message_list.append) == ['c/tree: now fails (Too big.)']
+
+def test_peak_tree_size():
+    # Expanding the product makes the tree grow well past both its input and output, and the peak must catch that.
+    builder = lambda: benchmark._make_point_product(2)
+    result = benchmark.run_workload(builder, 'tree', 10000, None, False)
+    assert 'error' not in result
+    assert result['peak_tree_size'] == max([result['input_size']] + result['tree_size_history'])
+    assert result['peak_tree_size'] > max(result['input_size'], result['output_size'])
+    # The history starts with the size of the input, and gains one more size with each rewrite.
+    assert result['tree_size_history'][0] == result['input_size']
+    assert len(result['tree_size_history']) == result['rewrite_count'] + 1
+    # The blade-sum engine goes straight to the result, so its peak is the larger of the input and the output.
+    result = benchmark.run_workload(builder, 'blade', 10000, None, False)
+    assert result['peak_tree_size'] == max(result['input_size'], result['output_size'])
+    assert result['rewrite_count'] == 0
+
+def test_max_tree_size_is_an_error():
+    result = benchmark.run_workload(lambda: benchmark._make_point_product(2), 'tree', 10000, 100, False)
+    assert result['error'] == 'Tree size (%d) exceeded limit (100).' % result['peak_tree_size']
+
+def test_baseline(tmp_path):
+    script_dir = os.path.join(str(tmp_path), 'scripts')
+    os.mkdir(script_dir)
+    with open(os.path.join(script_dir, 'square.py'), 'w') as handle:
+        handle.write('root = (e1 + e2) * (e1 + e2)\n')
+    baseline_path = os.path.join(str(tmp_path), 'baseline.json')
+    option_list = ['--scripts', script_dir, '--filter', 'square', '--engine', 'tree', '--repeat', '1', '--skip-memory', '--time-threshold', '1000']
+    assert benchmark.main(option_list + ['--save-baseline', baseline_path]) == 0
+    with open(baseline_path, 'r') as handle:
+        document = json.load(handle)
+    assert list(document['results'].keys()) == ['square/tree']
+    assert benchmark.main(option_list + ['--baseline', baseline_path]) == 0
+    # A baseline that needed fewer rewrites makes this run a regression.
+    document['results']['square/tree']['rewrite_count'] -= 1
+    with open(baseline_path, 'w') as handle:
+        json.dump(document, handle)
+    assert benchmark.main(option_list + ['--baseline', baseline_path]) == 1
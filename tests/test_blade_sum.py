@@ -0,0 +1,64 @@
+# test_blade_sum.py
+
+import pytest
+
+from benchmark import generated_workload_map
+from blade_sum import BladeSumCalculator
+from conftest import ignore_log
+from math_tree import MathTreeNode, simplify_tree
+from rewrite_engine import RewriteStats
+from metric import ConformalMetric
+
+def _assert_same_blade_sum(calculator, node_a, node_b):
+    # Two trees agree if their difference has no term with a coefficient worth mentioning.
+    difference = calculator.from_tree(node_a).add(calculator.from_tree(node_b), -1.0)
+    for blade, polynomial in difference.term_map.items():
+        for monomial, coefficient in polynomial.items():
+            assert abs(coefficient) < 1e-9, 'Left over: %r %r %r' % (coefficient, monomial, blade)
+
+def _null_vector_tree_list():
+    # These all mix the null vectors no and ni in with the Euclidean ones.
+    tree_list = []
+    for name, (function, size_list) in sorted(generated_workload_map.items()):
+        for size in size_list[:2]:
+            tree_list.append(('%s_%d' % (name, size), function(size)))
+    no, ni, e1, e2 = MathTreeNode('no'), MathTreeNode('ni'), MathTreeNode('e1'), MathTreeNode('e2')
+    tree_list.append(('no_ni', MathTreeNode('*', [no.copy(), ni.copy()])))
+    tree_list.append(('ni_no_ni', MathTreeNode('*', [ni.copy(), no.copy(), ni.copy()])))
+    tree_list.append(('flat', MathTreeNode('.', [MathTreeNode('^', [no.copy(), e1.copy(), ni.copy()]), MathTreeNode('^', [e2.copy(), ni.copy()])])))
+    tree_list.append(('rev', MathTreeNode('rev', [MathTreeNode('^', [no.copy(), e1.copy(), e2.copy(), ni.copy()])])))
+    return tree_list
+
+null_vector_tree_list = _null_vector_tree_list()
+
+@pytest.mark.parametrize('node', [node for name, node in null_vector_tree_list], ids=[name for name, node in null_vector_tree_list])
+def test_blade_sum_agrees_with_manipulators(node):
+    metric = ConformalMetric()
+    manipulated = simplify_tree(node.copy(), bilinear_form=metric, log=ignore_log)
+    summed = simplify_tree(node.copy(), bilinear_form=metric, log=ignore_log, blade_sum=True)
+    _assert_same_blade_sum(BladeSumCalculator(metric), manipulated, summed)
+
+def test_blade_sum_is_opt_in():
+    node = MathTreeNode('*', [MathTreeNode('no'), MathTreeNode('ni')])
+    message_list = []
+    simplify_tree(node.copy(), log=message_list.append)
+    assert BladeSumCalculator.__name__ not in message_list
+    message_list = []
+    stats = RewriteStats()
+    new_node = simplify_tree(node.copy(), log=message_list.append, stats=stats, blade_sum=True)
+    # The whole conversion is logged, and counted, as a single step.
+    assert message_list == [BladeSumCalculator.__name__, 'Tree size: %d' % new_node.size()]
+    assert stats.iter_count == 1
+    assert stats.tree_size_history == [node.size(), new_node.size()]
+
+def test_blade_sum_falls_back():
+    # The calculator knows nothing of functions, so the manipulators are left to make what they can of this.
+    node = MathTreeNode('+', [MathTreeNode('f', [MathTreeNode('e1')]), MathTreeNode('*', [MathTreeNode(2.0), MathTreeNode('e1'), MathTreeNode('e1')])])
+    message_list = []
+    new_node = simplify_tree(node.copy(), log=message_list.append, blade_sum=True)
+    assert BladeSumCalculator.__name__ not in message_list
+    assert new_node == simplify_tree(node.copy(), log=ignore_log)
+
+def test_blade_sum_max_tree_size():
+    with pytest.raises(Exception, match='exceeded limit'):
+        simplify_tree(null_vector_tree_list[0][1].copy(), log=ignore_log, blade_sum=True, max_tree_size=5)
@@ -0,0 +1,45 @@
+# test_evaluator.py
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from blade_sum import BladeSum
+from evaluator import CompiledTree, compile_tree
+from math_tree import MathTreeNode
+from metric import Metric
+
+def test_compiled_tree():
+    # This is (x + y e1) squared, which is x^2 + y^2 in any Euclidean metric.
+    node = MathTreeNode('*', [
+        MathTreeNode('+', [MathTreeNode('$x'), MathTreeNode('*', [MathTreeNode('$y'), MathTreeNode('e1')])]),
+        MathTreeNode('+', [MathTreeNode('$x'), MathTreeNode('*', [MathTreeNode('$y'), MathTreeNode('e1')])])
+    ])
+    compiled_tree = compile_tree(node, Metric.euclidean())
+    x = numpy.linspace(-1.0, 1.0, 5)
+    y = numpy.linspace(2.0, 3.0, 5)
+    result_map = compiled_tree({'$x': x, '$y': y})
+    assert numpy.allclose(result_map[()], x * x + y * y)
+    assert numpy.allclose(result_map[('e1',)], 2.0 * x * y)
+    with pytest.raises(Exception):
+        compiled_tree({'$x': x})
+
+def test_unknown_inner_products_are_inputs():
+    # The inner product of a and b isn't known, so it's an input, and the result broadcasts over all of them.
+    node = MathTreeNode('+', [MathTreeNode('.', [MathTreeNode('a'), MathTreeNode('b')]), MathTreeNode(3.0)])
+    compiled_tree = compile_tree(node)
+    assert compiled_tree.symbol_list == ['a.b']
+    result_map = compiled_tree({'a.b': numpy.array([[1.0], [2.0]])})
+    assert numpy.array_equal(result_map[()], numpy.array([[4.0], [5.0]]))
+
+def test_wide_blade():
+    # A blade with this many terms once made the generated source too deeply nested for Python to compile.
+    count = 10000
+    polynomial = {((('$s%d' % i),),): float(i % 7 - 3) for i in range(count)}
+    polynomial[()] = 0.5
+    compiled_tree = CompiledTree(BladeSum({('e1',): polynomial}))
+    value_list = numpy.linspace(0.0, 1.0, count)
+    symbol_map = {'$s%d' % i: numpy.array([value_list[i], 2.0 * value_list[i]]) for i in range(count)}
+    result = compiled_tree(symbol_map)[('e1',)]
+    expected = 0.5 + sum([float(i % 7 - 3) * value_list[i] for i in range(count)])
+    assert numpy.allclose(result, [expected, 2.0 * expected - 0.5])
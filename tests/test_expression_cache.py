@@ -0,0 +1,89 @@
+# test_expression_cache.py
+
+import os
+
+import pytest
+
+from conftest import load_script, script_path_list
+from expression_cache import ExpressionCache
+from math_tree import MathTreeNode, simplify_tree
+from metric import Metric
+from rewrite_engine import SubtreeMemo
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ExpressionCache(os.path.join(str(tmp_path), 'cache.sqlite'))
+    yield cache
+    cache.close()
+
+def _simplify(node, cache, **option_map):
+    message_list = []
+    result = simplify_tree(node, log=message_list.append, cache=cache, **option_map)
+    return result, 'ExpressionCache' in message_list
+
+@pytest.mark.parametrize('path', script_path_list[:4])
+def test_round_trip(cache, path):
+    node = simplify_tree(load_script(path), log=lambda message: None)
+    key = cache.make_key(node, Metric.conformal())
+    assert cache.get(key) is None
+    cache.put(key, node)
+    result = cache.get(key)
+    # What comes back is read through a MathTreeNodeFactory, and so is frozen, and shares its repeated subtrees.
+    assert result == node and result is not node and result.frozen
+    assert (cache.hit_count, cache.miss_count, cache.entry_count()) == (1, 1, 1)
+
+def test_keys_separate_forms(cache):
+    node = MathTreeNode('*', [MathTreeNode('e2'), MathTreeNode('e2')])
+    key = cache.make_key(node, Metric.signature(3))
+    assert key == cache.make_key(node.copy(), Metric.signature(3))
+    assert key != cache.make_key(node, Metric.signature(1, 2))
+    assert key != cache.make_key(node, Metric.signature(3), 'rewrite')
+    # A bilinear form that can't identify itself can't be part of a key, and then nothing is cached.
+    assert cache.make_key(node, lambda a, b: 1.0) is None
+    assert _simplify(node.copy(), cache, bilinear_form=Metric.signature(3)) == (MathTreeNode(1.0), False)
+    assert _simplify(node.copy(), cache, bilinear_form=Metric.signature(1, 2)) == (MathTreeNode(-1.0), False)
+    assert _simplify(node.copy(), cache, bilinear_form=Metric.signature(3)) == (MathTreeNode(1.0), True)
+    assert cache.entry_count() == 2
+
+def test_keys_separate_modes(cache):
+    # Each engine can give its own form of the result, so each has its own entry, and only ever finds its own.
+    node = load_script(script_path_list[1])
+    for i in range(2):
+        result_list = [
+            _simplify(node.copy(), cache),
+            _simplify(node.copy(), cache, blade_sum=True),
+            _simplify(node.copy(), cache, memo=SubtreeMemo()),
+        ]
+        assert [found for result, found in result_list] == [i == 1] * 3
+        assert cache.entry_count() == 3
+    # Single steps are never cached.
+    _simplify(node.copy(), cache, max_iters=1)
+    assert cache.entry_count() == 3
+
+def test_least_recently_used_evicted(tmp_path):
+    node_list = [MathTreeNode('+', [MathTreeNode(name), MathTreeNode(name + '2')]) for name in ['a', 'b', 'c', 'd']]
+    cache = ExpressionCache(os.path.join(str(tmp_path), 'cache.sqlite'))
+    key_list = [cache.make_key(node, Metric.conformal()) for node in node_list]
+    cache.put(key_list[0], node_list[0])
+    size = cache.total_size()
+    cache.close()
+    # This cache holds just two of these entries, which all compress to the same size.
+    cache = ExpressionCache(os.path.join(str(tmp_path), 'cache.sqlite'), max_bytes=2 * size)
+    cache.put(key_list[1], node_list[1])
+    assert cache.get(key_list[0]) == node_list[0]
+    # The first entry was used after the second, so it's the second that makes room for the third.
+    cache.put(key_list[2], node_list[2])
+    assert [cache.get(key) is not None for key in key_list[:3]] == [True, False, True]
+    cache.put(key_list[3], node_list[3])
+    assert [cache.get(key) is not None for key in key_list] == [False, False, True, True]
+    assert (cache.entry_count(), cache.total_size()) == (2, 2 * size)
+    cache.close()
+    # Opening the cache with a smaller limit evicts what no longer fits.
+    cache = ExpressionCache(os.path.join(str(tmp_path), 'cache.sqlite'), max_bytes=size)
+    assert [cache.get(key) is not None for key in key_list] == [False, False, False, True]
+    # An entry bigger than the whole cache is never kept.
+    cache.put(key_list[0], load_script(script_path_list[-1]))
+    assert cache.get(key_list[0]) is None
+    cache.clear()
+    assert (cache.entry_count(), cache.total_size()) == (0, 0)
+    cache.close()
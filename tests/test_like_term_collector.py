@@ -0,0 +1,49 @@
+# test_like_term_collector.py
+
+import pytest
+
+from blade_sum import BladeSumCalculator
+from conftest import ignore_log, load_script, script_path_list
+from manipulators.like_term_collector import LikeTermCollector
+from math_tree import make_rewrite_engine
+from rewrite_engine import RewriteEngine
+from serialization import parse_expression_text
+
+def _collect(text):
+    new_node = LikeTermCollector()._manipulate_subtree(parse_expression_text(text))
+    return None if new_node is None else new_node.expression_text()
+
+def test_scalars_in_any_order():
+    assert _collect('(($x*$y*a)+($y*$x*a))') == '((2.00*$x*$y*a))'
+    assert _collect('(($x*$y*(a.b))+($y*(a.b)*$x)+$z)') == '((2.00*$x*$y*(a.b))+$z)'
+
+def test_coefficients_that_cancel():
+    assert _collect('((2.00*a)+b+(-2.00*a))') == '(b)'
+    assert _collect('((0.50*a)+(0.25*a)+(-0.75*a))') == '0.00'
+    assert _collect('((0.50*a)+(0.25*a)+(a.b)+(2.00*(a.b))+1.00+2.00)') == '((0.75*a)+(3.00*(a.b))+3.00)'
+
+def test_outer_and_geometric_products():
+    # A scalar times a vector is the same term whichever product it's written with.
+    assert _collect('(($x*a)+($x^a))') == '((2.00*$x*a))'
+    assert _collect('((2.00^$x^a^b)+(-1.00^$x^a^b))') == '(($x^a^b))'
+    # Not so for two vectors, and the collector doesn't reorder vectors, either.
+    assert _collect('((a^b)+(a*b)+(b^a))') is None
+
+def test_terms_that_must_not_merge():
+    assert _collect('(($x*a)+($x*$x*a)+($y*a)+(a.b)+(b.a)+(3.00*b)+(a^b^c)+(a^c^b))') is None
+    # Terms that aren't blades are left alone, even if they repeat.
+    assert _collect('(fn(a)+fn(a)+(a*(b+c))+(a*(b+c)))') is None
+    assert _collect('(fn(a)+$x+fn(a)+$x)') == '(fn(a)+(2.00*$x)+fn(a))'
+
+@pytest.mark.parametrize('path', script_path_list)
+def test_collecting_keeps_value(path):
+    # The collector changes the form of some results, but never what they're worth.
+    engine = make_rewrite_engine()
+    other_engine = RewriteEngine([manipulator for manipulator in engine.manipulator_list if not isinstance(manipulator, LikeTermCollector)])
+    calculator = BladeSumCalculator(engine.manipulator_list[0].bilinear_form)
+    blade_sum = calculator.from_tree(engine.manipulate_tree(load_script(path), log=ignore_log))
+    other_blade_sum = calculator.from_tree(other_engine.manipulate_tree(load_script(path), log=ignore_log))
+    if blade_sum is None or other_blade_sum is None:
+        pytest.skip('The blade-sum calculator cannot evaluate this result.')
+    for polynomial in blade_sum.add(other_blade_sum, -1.0).term_map.values():
+        assert all([abs(coefficient) < 1e-9 for coefficient in polynomial.values()])
@@ -0,0 +1,137 @@
+# test_math_tree.py
+
+import random
+
+import pytest
+
+from math_tree import ExpressionSet, MathTreeManipulator, MathTreeNode, MathTreeNodeFactory, build_node
+from serialization import from_list, to_list
+
+def _make_tree(a='a', b=2.0):
+    return MathTreeNode('+', [MathTreeNode('*', [MathTreeNode(b), MathTreeNode(a)]), MathTreeNode('.', [MathTreeNode(a), MathTreeNode('b')])])
+
+def test_hash_agrees_with_equality():
+    assert _make_tree() == _make_tree()
+    assert hash(_make_tree()) == hash(_make_tree())
+    # Of these, each differs from the others in a single leaf, or in the order of the children.
+    other_list = [_make_tree('c'), _make_tree(b=-2.0), _make_tree(b=1.0), MathTreeNode('+', list(reversed(_make_tree().child_list)))]
+    for i, node in enumerate(other_list):
+        assert node != _make_tree()
+        for other_node in other_list[i + 1:]:
+            assert node != other_node
+    assert len(set([hash(node) for node in other_list + [_make_tree()]])) == len(other_list) + 1
+    # Equal nodes must hash the same, and 0.0 == -0.0.
+    assert MathTreeNode(0.0) == MathTreeNode(-0.0)
+    assert hash(MathTreeNode(0.0)) == hash(MathTreeNode(-0.0))
+
+def test_hash_after_replace_child():
+    node = _make_tree()
+    hash(node)
+    # A node that isn't frozen is changed in place, so what it cached about its old children must go.
+    assert node.replace_child(1, MathTreeNode('c')) is node
+    assert hash(node) == hash(MathTreeNode('+', [_make_tree().child_list[0], MathTreeNode('c')]))
+    # A frozen node is copied instead, and so keeps its hash.
+    node = _make_tree().freeze()
+    old_hash = hash(node)
+    new_node = node.replace_child(1, MathTreeNode('c'))
+    assert new_node is not node and new_node.frozen
+    assert hash(node) == old_hash and node == _make_tree()
+    assert hash(new_node) == hash(MathTreeNode('+', [_make_tree().child_list[0], MathTreeNode('c')]))
+
+def test_expression_set_collision():
+    node = _make_tree().freeze()
+    other_node = _make_tree('c').freeze()
+    # Make the two trees collide, as though their hashes just happened to be the same.
+    other_node.structure_hash = hash(node)
+    expression_set = ExpressionSet()
+    expression_set.add(node)
+    assert other_node not in expression_set
+    assert _make_tree() in expression_set
+    expression_set.add(other_node)
+    assert other_node in expression_set and node in expression_set
+    with pytest.raises(Exception):
+        expression_set.add(_make_tree())
+
+def test_factory_shares_subtrees():
+    factory = MathTreeNodeFactory()
+    node = factory.intern(_make_tree())
+    assert node.frozen
+    assert factory.intern(_make_tree()) is node
+    assert factory.intern(node) is node
+    # Both of the a leaves are the same instance.
+    assert node.child_list[0].child_list[1] is node.child_list[1].child_list[0]
+    # What's equal, but not the same, is kept apart.
+    assert factory.create(0.0) is not factory.create(-0.0)
+    assert factory.create(1) is not factory.create(1.0)
+    assert factory.intern(_make_tree('c')) is not node
+
+def test_factory_builds_nodes():
+    factory = MathTreeNodeFactory()
+    term = lambda: build_node('*', [2.0, 'a'], 1.0, factory)
+    node = build_node('+', [term(), term(), build_node('+', [], 0.0, factory)], 0.0, factory)
+    assert node.child_list[0] is node.child_list[1]
+    assert node == build_node('+', [term(), term(), 0.0], 0.0)
+    assert build_node('*', [term()], 1.0, factory) is term()
+    # Reading a tree back through a factory shares its subtrees with everything else the factory made.
+    read_node = from_list(to_list(node), factory)
+    assert read_node is node
+
+def test_is_valid():
+    leaf = MathTreeNode('a')
+    assert not MathTreeNode('+', [leaf, leaf]).is_valid()
+    leaf.freeze()
+    assert MathTreeNode('+', [leaf, leaf]).is_valid()
+    # A frozen node can't have a child that isn't.
+    node = MathTreeNode('+', [MathTreeNode('a')]).freeze()
+    node.child_list.append(MathTreeNode('b'))
+    assert not node.is_valid()
+
+def test_is_valid_catches_changes_in_place():
+    node = _make_tree().freeze()
+    hash(node)
+    assert node.is_valid()
+    # This is what a manipulator that breaks the rules might do to a subtree it shares with older trees.
+    node.child_list[0].child_list.append(MathTreeNode('c').freeze())
+    assert not node.is_valid()
+    assert not MathTreeNode('+', [node.child_list[0]]).is_valid(new_only=True)
+
+def test_is_valid_new_only():
+    old_node = _make_tree().freeze()
+    hash(old_node)
+    new_node = MathTreeNode('+', [old_node.child_list[0], old_node.child_list[0], MathTreeNode('c')])
+    assert new_node.is_valid(new_only=True)
+    new_leaf = MathTreeNode('d')
+    assert not MathTreeNode('+', [old_node, MathTreeNode('*', [new_leaf]), new_leaf]).is_valid(new_only=True)
+
+def _bubble_sort(given_list, sort_key):
+    # This is how _sort_list() used to sort, and so the order and swap count it must still give.
+    adjacent_swap_count = 0
+    keep_going = True
+    while keep_going:
+        keep_going = False
+        for i in range(len(given_list) - 1):
+            if sort_key(given_list[i]) > sort_key(given_list[i + 1]):
+                given_list[i], given_list[i + 1] = given_list[i + 1], given_list[i]
+                adjacent_swap_count += 1
+                keep_going = True
+    return adjacent_swap_count
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sort_list_matches_bubble_sort(seed):
+    generator = random.Random(seed)
+    manipulator = MathTreeManipulator()
+    for length in list(range(8)) + [generator.randrange(8, 100) for i in range(10)]:
+        # Keys repeat a lot, so that we see that equal items keep their order, as they must for the signs to work.
+        item_list = [(generator.choice('abcde'), i) for i in range(length)]
+        expected_list = item_list[:]
+        expected_count = _bubble_sort(expected_list, lambda item: item[0])
+        actual_list = item_list[:]
+        actual_count = manipulator._sort_list(actual_list, lambda item: item[0])
+        assert actual_list == expected_list
+        assert actual_count == expected_count
+
+def test_sort_list_parity():
+    # The outer product of vectors out of order changes sign with the parity of the permutation that sorts them.
+    vector_list = [MathTreeNode(name) for name in ['e3', 'e1', 'e2', 'no', 'e1']]
+    assert MathTreeManipulator()._sort_list(vector_list, lambda vector: vector.data) == 5
+    assert [vector.data for vector in vector_list] == ['e1', 'e1', 'e2', 'e3', 'no']
@@ -0,0 +1,98 @@
+# test_metric.py
+
+import subprocess
+import sys
+
+import pytest
+
+from conftest import repo_dir
+from metric import ConformalMetric, Metric
+
+def test_inner_products():
+    metric = ConformalMetric()
+    assert metric('e1', 'e1') == 1.0 and metric('e1', 'e2') == 0.0
+    assert metric('no', 'ni') == -1.0 and metric('ni', 'ni') == 0.0
+    # Any other vector named e* is orthogonal to no and ni, but its inner products are otherwise unknown.
+    assert metric('e7', 'no') == 0.0 and metric('ni', 'e7') == 0.0
+    assert metric('e7', 'e1') is None and metric('a', 'no') is None
+    metric = Metric.minkowski()
+    assert [metric('e%d' % i, 'e%d' % i) for i in range(4)] == [1.0, -1.0, -1.0, -1.0]
+    assert metric.index_of('e2') == 2 and metric.index_of('e9') is None
+
+def test_gram_matrix_checks():
+    with pytest.raises(Exception, match='unique'):
+        Metric(['a', 'a'], [[1.0, 0.0], [0.0, 1.0]])
+    with pytest.raises(Exception, match='2 by 2'):
+        Metric(['a', 'b'], [[1.0, 0.0], [0.0]])
+    with pytest.raises(Exception, match='symmetric'):
+        Metric(['a', 'b'], [[1.0, 2.0], [3.0, 1.0]])
+
+def test_gram_matrix_as_array():
+    numpy = pytest.importorskip('numpy')
+    metric = Metric(['a', 'b'], numpy.array([[1, 2], [2, 3]]))
+    assert metric('a', 'b') == 2.0 and isinstance(metric('a', 'b'), float)
+    assert numpy.array_equal(metric.gram_matrix, numpy.array([[1.0, 2.0], [2.0, 3.0]]))
+
+def test_fingerprint():
+    # Fingerprints are part of the keys of on-disk caches, so they must never change from one version to the next.
+    assert ConformalMetric().fingerprint() == '1248e4b51da34a7d5757920220472987dafba53a'
+    assert ConformalMetric().fingerprint() == Metric.conformal().fingerprint()
+    assert Metric.signature(3).fingerprint() != Metric.signature(1, 2).fingerprint()
+    assert Metric.signature(4).fingerprint() == Metric.diagonal(['e1', 'e2', 'e3', 'e4'], [1.0] * 4).fingerprint()
+
+def test_simplifying_without_numpy():
+    # NumPy is only needed by the evaluator and the GUI, so the simplifier must work without it.
+    code = '\n'.join([
+        'import sys',
+        'sys.modules["numpy"] = None',
+        'from math_tree import MathTreeNode, simplify_tree',
+        'node = MathTreeNode("*", [MathTreeNode("no"), MathTreeNode("ni")])',
+        'print(simplify_tree(node, log=lambda message: None).expression_text())'
+    ])
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=repo_dir, universal_newlines=True)
+    assert output.strip() == '((-1.00^ni^no)+-1.00)'
+
+def test_blade_mask():
+    metric = ConformalMetric()
+    assert metric.blade_mask([]) == (1, 0)
+    assert metric.blade_mask(['e1', 'e2']) == (1, 3)
+    assert metric.blade_mask(['e2', 'e1']) == (-1, 3)
+    assert metric.blade_mask(['no', 'e3', 'ni']) == (1, 28)
+    assert metric.blade_mask(['e1', 'e2', 'e1']) == (0, 3)
+    assert metric.blade_mask(['e1', 'a']) == (None, None)
+    assert metric.blade_vectors(28) == ['e3', 'ni', 'no']
+
+def _product(metric, product, blade_a, blade_b):
+    # This writes the product of two basis blades out by name, with the blades named in canonical order.
+    return [(tuple(metric.blade_vectors(mask)), coefficient) for mask, coefficient in metric.blade_product(product, metric.blade_mask(blade_a)[1], metric.blade_mask(blade_b)[1])]
+
+def test_blade_products():
+    # These are all worked out by hand.
+    metric = ConformalMetric()
+    assert _product(metric, '*', ['e1'], ['e1']) == [((), 1.0)]
+    assert _product(metric, '*', ['e1'], ['e2']) == [(('e1', 'e2'), 1.0)]
+    assert _product(metric, '*', ['e2'], ['e1']) == [(('e1', 'e2'), -1.0)]
+    assert _product(metric, '*', ['e1', 'e2'], ['e2', 'e3']) == [(('e1', 'e3'), 1.0)]
+    assert _product(metric, '*', ['e1', 'e2'], ['e1', 'e2']) == [((), -1.0)]
+    # In ni*no = ni.no + ni^no, the inner product is -1, and ni^no is in canonical order, but no^ni isn't.
+    assert _product(metric, '*', ['ni'], ['no']) == [((), -1.0), (('ni', 'no'), 1.0)]
+    assert _product(metric, '*', ['no'], ['ni']) == [((), -1.0), (('ni', 'no'), -1.0)]
+    assert _product(metric, '*', ['ni'], ['ni']) == []
+    assert _product(metric, '.', ['ni'], ['no']) == [((), -1.0)]
+    assert _product(metric, '.', ['e1', 'e2'], ['e1', 'e2']) == [((), -1.0)]
+    assert _product(metric, '.', ['e1'], ['e1', 'e2']) == [(('e2',), 1.0)]
+    assert _product(metric, '.', ['e1', 'e2'], ['e1']) == [(('e2',), -1.0)]
+    assert _product(metric, '^', ['e1'], ['e2', 'e3']) == [(('e1', 'e2', 'e3'), 1.0)]
+    assert _product(metric, '^', ['no'], ['no']) == []
+    assert _product(Metric.signature(1, 1), '*', ['e2'], ['e2']) == [((), -1.0)]
+
+def test_blade_product_tables():
+    # The tables only ever hold the products asked for, and each is only worked out once.
+    metric = Metric.signature(3)
+    assert metric.cayley_table_map == {}
+    entry = metric.blade_product('*', 3, 6)
+    assert metric.blade_product('*', 3, 6) is entry
+    metric.blade_product('*', 6, 3)
+    metric.blade_product('^', 3, 6)
+    assert sorted(metric.cayley_table_map['*'].keys()) == [(3, 6), (6, 3)]
+    assert list(metric.cayley_table_map['^'].keys()) == [(3, 6)]
@@ -0,0 +1,61 @@
+# test_parallel_simplify.py
+
+import os
+
+import pytest
+
+from benchmark import _make_point_product, _make_wedge
+from blade_sum import BladeSumCalculator
+from conftest import ignore_log
+from expression_cache import ExpressionCache
+from math_tree import MathTreeNode, simplify_tree
+from metric import Metric
+from parallel_simplify import ParallelSimplifier
+
+@pytest.fixture(scope='module')
+def parallel():
+    with ParallelSimplifier(processes=2) as parallel:
+        yield parallel
+
+def _assert_same_value(node, other_node, bilinear_form=None):
+    calculator = BladeSumCalculator(bilinear_form)
+    for polynomial in calculator.from_tree(node).add(calculator.from_tree(other_node), -1.0).term_map.values():
+        assert all([abs(coefficient) < 1e-9 for coefficient in polynomial.values()])
+
+@pytest.mark.parametrize('builder', [lambda: _make_point_product(2), lambda: _make_wedge(3)], ids=['point_product_2', 'wedge_3'])
+def test_parallel_matches_serial(parallel, builder):
+    message_list = []
+    result = parallel.simplify(builder(), log=message_list.append)
+    assert any([message.endswith('chunks') for message in message_list])
+    _assert_same_value(result, simplify_tree(builder(), log=ignore_log))
+
+def test_pool_follows_the_form(parallel):
+    # The form is sent to the workers when the pool starts, so a new form needs a new pool, but an equal one doesn't.
+    node = MathTreeNode('*', [MathTreeNode('+', [MathTreeNode('e1'), MathTreeNode('e2'), MathTreeNode('e3')]), MathTreeNode('e2')])
+    pool_list = []
+    for bilinear_form in [Metric.signature(3), Metric.signature(3), Metric.signature(1, 2)]:
+        result = parallel.simplify(node.copy(), bilinear_form, log=ignore_log)
+        assert result == simplify_tree(node.copy(), bilinear_form=bilinear_form, log=ignore_log)
+        pool_list.append(parallel.pool)
+    assert pool_list[1] is pool_list[0] and pool_list[2] is not pool_list[0]
+    # The square of e2 is 1 in the first metric, but -1 in the second.
+    assert MathTreeNode(-1.0) in result.child_list
+
+def test_unpicklable_form(parallel):
+    bilinear_form = lambda vector_a, vector_b: 1.0 if vector_a == vector_b else 0.0
+    message_list = []
+    result = parallel.simplify(_make_wedge(2), bilinear_form, log=message_list.append)
+    assert 'cannot send the bilinear form' in message_list[0]
+    assert result == simplify_tree(_make_wedge(2), bilinear_form=bilinear_form, log=ignore_log)
+
+def test_cache_keeps_parallel_apart(parallel, tmp_path):
+    cache = ExpressionCache(os.path.join(str(tmp_path), 'cache.sqlite'))
+    node = _make_point_product(2)
+    simplify_tree(node.copy(), log=ignore_log, cache=cache, parallel=parallel)
+    message_list = []
+    simplify_tree(node.copy(), log=message_list.append, cache=cache)
+    assert 'ExpressionCache' not in message_list and cache.entry_count() == 2
+    message_list = []
+    simplify_tree(node.copy(), log=message_list.append, cache=cache, parallel=parallel)
+    assert message_list == ['ExpressionCache']
+    cache.close()
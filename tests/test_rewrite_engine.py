@@ -0,0 +1,174 @@
+# test_rewrite_engine.py
+
+import threading
+
+import pytest
+
+from benchmark import _make_point_product
+from blade_sum import BladeSumCalculator
+from conftest import ignore_log, load_script, script_path_list
+from math_tree import MathTreeManipulator, MathTreeNode, make_rewrite_engine, manipulate_tree, simplify_tree, start_simplification
+from metric import Metric
+from rewrite_engine import RewriteCancelled, RewriteEngine, SubtreeMemo
+
+def _record(simplify, node):
+    # This gives every message logged along the way, but for the grade cache statistics, and how it all ended.
+    message_list = []
+    try:
+        result = simplify(node, message_list.append)
+    except Exception as ex:
+        result = str(ex)
+    return [message for message in message_list if not message.startswith('Grade cache')], result
+
+@pytest.mark.parametrize('path', script_path_list)
+def test_engine_matches_manipulate_tree(path):
+    # The engine must make the same manipulations, in the same order, as the plain manipulate_tree() does.
+    manipulator_list = make_rewrite_engine().manipulator_list
+    expected = _record(lambda node, log: manipulate_tree(node, manipulator_list, log=log), load_script(path))
+    actual = _record(lambda node, log: make_rewrite_engine().manipulate_tree(node, log=log), load_script(path))
+    assert actual == expected
+
+def test_engine_resumes_from_what_it_learned():
+    engine = make_rewrite_engine()
+    node = engine.manipulate_tree(load_script(script_path_list[1]), log=lambda message: None).freeze()
+    # Everything in a simplified tree is known to be inert, so simplifying it again visits only the root.
+    assert node.inert_engine_id == engine.engine_id
+    message_list = []
+    assert engine.manipulate_tree(node, log=message_list.append) is node
+    assert len([message for message in message_list if not message.startswith('Grade cache')]) == 0
+
+def test_engine_forgets_what_another_learned():
+    # The same frozen tree is simplified under two metrics, and the second must not trust what the first learned.
+    node = MathTreeNode('*', [MathTreeNode('e2'), MathTreeNode('e2')]).freeze()
+    assert simplify_tree(node, bilinear_form=Metric.signature(3), persistent=True, log=lambda message: None) == MathTreeNode(1.0)
+    assert simplify_tree(node, bilinear_form=Metric.signature(1, 2), persistent=True, log=lambda message: None) == MathTreeNode(-1.0)
+    assert simplify_tree(node, bilinear_form=Metric.signature(3), persistent=True, log=lambda message: None) == MathTreeNode(1.0)
+
+class _ChildChanger(MathTreeManipulator):
+    # This breaks the rule against changing nodes in place, by changing a child it then shares with the old tree.
+    handled_ops = ['+']
+
+    def _manipulate_subtree(self, node):
+        child = node.child_list[0]
+        if len(child.child_list) > 0:
+            child.child_list.pop()
+            return MathTreeNode('+', [child] + node.child_list[1:])
+
+def test_engine_catches_changes_in_place():
+    node = MathTreeNode('+', [MathTreeNode('*', [MathTreeNode('a'), MathTreeNode('b')]), MathTreeNode('c')])
+    with pytest.raises(Exception, match='not valid'):
+        RewriteEngine([_ChildChanger()]).manipulate_tree(node, log=lambda message: None)
+
+@pytest.mark.parametrize('path', script_path_list)
+def test_memo_keeps_value(path):
+    # Simplifying bottom-up can change the form of the result, but never what it's worth.
+    engine = make_rewrite_engine()
+    memo = SubtreeMemo()
+    result = engine.manipulate_tree(load_script(path), log=ignore_log)
+    memo_result = engine.manipulate_tree(load_script(path), log=ignore_log, memo=memo)
+    # Simplifying again with the same memo only ever looks it up.
+    assert engine.manipulate_tree(load_script(path), log=ignore_log, memo=memo) == memo_result
+    calculator = BladeSumCalculator(engine.manipulator_list[0].bilinear_form)
+    blade_sum = calculator.from_tree(result)
+    memo_blade_sum = calculator.from_tree(memo_result)
+    if blade_sum is None or memo_blade_sum is None:
+        pytest.skip('The blade-sum calculator cannot evaluate this result.')
+    for polynomial in blade_sum.add(memo_blade_sum, -1.0).term_map.values():
+        assert all([abs(coefficient) < 1e-9 for coefficient in polynomial.values()])
+
+def test_memo_forgets_least_recently_used():
+    memo = SubtreeMemo(max_size=2)
+    node_list = [MathTreeNode(name).freeze() for name in ['a', 'b', 'c']]
+    memo.put(node_list[0], node_list[0])
+    memo.put(node_list[1], node_list[1])
+    assert memo.get(node_list[0]) is node_list[0]
+    memo.put(node_list[2], node_list[2])
+    assert [memo.get(node) is not None for node in node_list] == [True, False, True]
+    assert (memo.hit_count, memo.miss_count) == (3, 1)
+    assert list(memo.result_map.keys()) == [node_list[0], node_list[2]]
+
+def test_memo_is_bound_to_its_metric():
+    # What the memo learned under one metric is wrong under another, so it refuses to be used there.
+    memo = SubtreeMemo()
+    node = MathTreeNode('*', [MathTreeNode('e2'), MathTreeNode('e2')])
+    assert simplify_tree(node.copy(), bilinear_form=Metric.signature(3), memo=memo, log=ignore_log) == MathTreeNode(1.0)
+    with pytest.raises(Exception, match='cannot be shared'):
+        simplify_tree(node.copy(), bilinear_form=Metric.signature(1, 2), memo=memo, log=ignore_log)
+    # An equal metric, though, has the same engine, and so can use the memo.
+    hit_count = memo.hit_count
+    assert simplify_tree(node.copy(), bilinear_form=Metric.signature(3), memo=memo, log=ignore_log) == MathTreeNode(1.0)
+    assert memo.hit_count > hit_count
+    with pytest.raises(Exception, match='cannot be shared'):
+        make_rewrite_engine(Metric.signature(3)).manipulate_tree(node.copy(), log=ignore_log, memo=memo)
+
+def test_session_steps():
+    node = load_script(script_path_list[2])
+    session = start_simplification(node, log=ignore_log)
+    manipulator_name_list = [manipulator.__class__.__name__ for manipulator in session.engine.manipulator_list]
+    step_count = 0
+    for step in session:
+        step_count += 1
+        assert step.node is session.node and session.step_count == step_count
+        assert step.manipulator_name in manipulator_name_list
+        assert step.tree_size == step.node.size()
+        # Only the node at the end of the path was replaced, so everything off the path is shared with the last tree.
+        old_node = node
+        new_node = step.node
+        for i in step.path:
+            assert len(new_node.child_list) == len(old_node.child_list)
+            assert all([new_child is old_child for j, (new_child, old_child) in enumerate(zip(new_node.child_list, old_node.child_list)) if j != i])
+            old_node = old_node.child_list[i]
+            new_node = new_node.child_list[i]
+        assert new_node is not old_node
+        node = step.node
+    assert step_count > 0 and session.finished
+    assert session.node == make_rewrite_engine().manipulate_tree(load_script(script_path_list[2]), log=ignore_log)
+    # Once finished, a session stays finished.
+    assert session.step() is None and session.step() is None
+    assert session.run() == [] and session.step_count == step_count
+
+def test_session_resumes():
+    # Running a few steps at a time takes the same steps as running them all at once.
+    step_list = start_simplification(load_script(script_path_list[3]), log=ignore_log).run()
+    session = start_simplification(load_script(script_path_list[3]), log=ignore_log)
+    other_step_list = []
+    while True:
+        new_step_list = session.run(max_steps=3)
+        assert len(new_step_list) <= 3
+        if len(new_step_list) == 0:
+            break
+        other_step_list += new_step_list
+    assert len(step_list) > 3
+    assert [(step.manipulator_name, step.path, step.node) for step in other_step_list] == [(step.manipulator_name, step.path, step.node) for step in step_list]
+
+def test_session_cancelled():
+    session = start_simplification(load_script(script_path_list[2]), log=ignore_log)
+    session.cancel_event = threading.Event()
+    session.step()
+    node = session.node
+    session.cancel_event.set()
+    with pytest.raises(RewriteCancelled):
+        session.step()
+    assert session.node is node and session.step_count == 1
+    session.cancel_event.clear()
+    assert session.step() is not None
+
+def test_session_max_tree_size():
+    # Expanding this product grows the tree to a few hundred nodes before it shrinks again.
+    session = start_simplification(_make_point_product(2), max_tree_size=200, log=ignore_log)
+    with pytest.raises(Exception, match='exceeded limit'):
+        session.run()
+
+class _Rotator(MathTreeManipulator):
+    # This rotates the terms of a sum, so that it comes back to where it started after as many steps as there are terms.
+    handled_ops = ['+']
+
+    def _manipulate_subtree(self, node):
+        return MathTreeNode('+', node.child_list[1:] + node.child_list[:1])
+
+def test_session_detects_repeats_across_steps():
+    node = MathTreeNode('+', [MathTreeNode('a'), MathTreeNode('b'), MathTreeNode('c')])
+    session = RewriteEngine([_Rotator()]).start_session(node, log=ignore_log)
+    assert [step.node.expression_text() for step in session.run(max_steps=2)] == ['(b+c+a)', '(c+a+b)']
+    with pytest.raises(Exception, match='Expression repeated!'):
+        session.step()
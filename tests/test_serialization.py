@@ -0,0 +1,75 @@
+# test_serialization.py
+
+import io
+import math
+
+import pytest
+
+from conftest import ignore_log, load_script, script_path_list
+from math_tree import MathTreeNode, start_simplification
+from serialization import dump, dumps, from_list, load, loads, parse_expression_text, to_list
+
+def _yield_step_trees(path):
+    # This yields the script's tree, and then every tree the manipulators turn it into, one step at a time.
+    session = start_simplification(load_script(path), log=ignore_log)
+    yield session.node
+    for step in session:
+        yield step.node
+
+def _round_numbers(node):
+    # The text of a tree rounds its numbers to two places, so this is what reading it back can give us at best.
+    return MathTreeNode(round(node.data, 2) if isinstance(node.data, float) else node.data, [_round_numbers(child) for child in node.child_list])
+
+def _has_single_operands(node):
+    # Parentheses around a single operand are read back as just that operand, so such trees can't round-trip.
+    return any([len(other_node.child_list) == 1 and other_node.data in ['+', '*', '^', '.', '-', '/'] for other_node in node.yield_nodes()])
+
+@pytest.mark.parametrize('path', script_path_list)
+def test_expression_text_round_trip(path):
+    count = 0
+    for node in _yield_step_trees(path):
+        if _has_single_operands(node):
+            continue
+        assert parse_expression_text(node.expression_text()) == _round_numbers(node)
+        count += 1
+    assert count > 0
+
+@pytest.mark.parametrize('path', script_path_list)
+def test_serialized_round_trip(path):
+    for node in _yield_step_trees(path):
+        text = dumps(node)
+        assert loads(text) == node
+        assert from_list(to_list(node)) == node
+        handle = io.StringIO()
+        dump(node, handle, chunk_size=3)
+        assert handle.getvalue() == text
+        assert load(io.StringIO(text), chunk_size=5) == node
+
+def test_empty_operators():
+    assert parse_expression_text(MathTreeNode('+').expression_text()) == MathTreeNode('+')
+    assert parse_expression_text('()') == MathTreeNode('+')
+    node = MathTreeNode('*', [MathTreeNode('a'), MathTreeNode('+')])
+    assert parse_expression_text(node.expression_text()) == node
+    assert parse_expression_text('inv(())') == MathTreeNode('inv', [MathTreeNode('+')])
+
+def test_special_numbers():
+    for value in [math.inf, -math.inf]:
+        node = MathTreeNode('*', [MathTreeNode(value), MathTreeNode('a')])
+        assert parse_expression_text(node.expression_text()) == node
+    node = parse_expression_text(MathTreeNode('+', [MathTreeNode(math.nan), MathTreeNode('info')]).expression_text())
+    assert math.isnan(node.child_list[0].data)
+    assert node.child_list[1].data == 'info'
+
+def test_deep_tree():
+    # Neither reading the text nor the serialized list recurses, so depth is no problem.  Writing the text and
+    # comparing trees do recurse, so we check against the lists instead.
+    depth = 10000
+    item_list = ['inv', 1] * depth + ['a', 0]
+    node = parse_expression_text('inv(' * depth + 'a' + ')' * depth)
+    assert to_list(node) == item_list
+    assert to_list(loads(dumps(node))) == item_list
+
+def test_malformed_text():
+    for text in ['(a+b', '(a+b))', '(a+b*c)', 'f(a', ',']:
+        with pytest.raises(Exception):
+            parse_expression_text(text)
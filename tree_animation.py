@@ -0,0 +1,130 @@
+# tree_animation.py
+
+import numpy
+
+class TreeAnimation(object):
+    # This lays out a tree and moves its nodes toward where the layout puts them.  Nodes know nothing about
+    # where they're drawn; instead, we keep every position and target position in an array, with a row per
+    # node, so that a tick is a handful of array operations however big the tree is.  The rows are in the
+    # order of yield_nodes(), which is also the order TreeRenderer wants.
+
+    # Each node is a unit box, each level is this far below the one above, and sibling subtrees are this far apart.
+    level_height = 2.0
+    padding = 0.5
+
+    def __init__(self):
+        self.root_node = None
+        self.node_list = []
+        self.parent_array = numpy.zeros(0, dtype=numpy.int64)
+        self.child_index_list = []
+        self.position_array = numpy.zeros((0, 2), dtype=numpy.float64)
+        self.target_array = numpy.zeros((0, 2), dtype=numpy.float64)
+
+    def set_tree(self, root_node, carry_positions=False):
+        # New nodes start out on top of their parent, and the root, at the origin.  If asked, whatever the new
+        # tree has in common with the old one starts out where it is now, so that only what changed moves.
+        old_node_list = self.node_list
+        old_child_index_list = self.child_index_list
+        old_position_array = self.position_array
+        self.root_node = root_node
+        self.node_list, parent_list = self._index_tree(root_node)
+        self.parent_array = numpy.array(parent_list, dtype=numpy.int64)
+        self.child_index_list = self._make_child_index_list(parent_list)
+        self.target_array = self._calculate_target_positions()
+        position_array = numpy.zeros((len(self.node_list), 2), dtype=numpy.float64)
+        carried_mask = numpy.zeros(len(self.node_list), dtype=bool)
+        if carry_positions and len(old_node_list) > 0 and len(self.node_list) > 0:
+            for i, j in self._match_nodes(old_node_list, old_child_index_list):
+                position_array[j] = old_position_array[i]
+                carried_mask[j] = True
+        # Parents come before their children, so a parent's position is always settled before it's handed down.
+        for j in range(1, len(self.node_list)):
+            if not carried_mask[j]:
+                position_array[j] = position_array[self.parent_array[j]]
+        self.position_array = position_array
+
+    def _index_tree(self, root_node):
+        node_list = []
+        parent_list = []
+        if root_node is None:
+            return node_list, parent_list
+        stack = [(root_node, -1)]
+        while len(stack) > 0:
+            node, parent = stack.pop()
+            parent_list.append(parent)
+            node_list.append(node)
+            stack += [(child, len(node_list) - 1) for child in reversed(node.child_list)]
+        return node_list, parent_list
+
+    def _make_child_index_list(self, parent_list):
+        # Since we index in pre-order, the children of each node come out in their order in its child list.
+        child_index_list = [[] for i in range(len(parent_list))]
+        for j, i in enumerate(parent_list):
+            if i >= 0:
+                child_index_list[i].append(j)
+        return child_index_list
+
+    def _match_nodes(self, old_node_list, old_child_index_list):
+        # This yields the indices of the old and new nodes that we take to be the same node of the tree.  The
+        # roots always match, and otherwise, children match if they're in the same place under matching parents
+        # and hold the same data.
+        stack = [(0, 0)]
+        while len(stack) > 0:
+            i, j = stack.pop()
+            yield i, j
+            for old_i, new_j in zip(old_child_index_list[i], self.child_index_list[j]):
+                if old_node_list[old_i].data == self.node_list[new_j].data:
+                    stack.append((old_i, new_j))
+
+    def _calculate_target_positions(self):
+        # Each node's children have their subtrees laid out side by side beneath it, each centered in a slot as
+        # wide as the subtree.  Going from the leaves up, we find how far each child is from its parent, and how
+        # far each subtree reaches to either side of its root.  Then, going from the root down, we place them.
+        count = len(self.node_list)
+        offset_array = numpy.zeros(count, dtype=numpy.float64)
+        left_list = [-0.5] * count
+        right_list = [0.5] * count
+        for i in reversed(range(count)):
+            index_list = self.child_index_list[i]
+            if len(index_list) == 0:
+                continue
+            width_list = [right_list[j] - left_list[j] for j in index_list]
+            x = -(sum(width_list) + float(len(index_list) - 1) * self.padding) / 2.0
+            for j, width in zip(index_list, width_list):
+                offset_array[j] = x + width / 2.0
+                left_list[i] = min(left_list[i], offset_array[j] + left_list[j])
+                right_list[i] = max(right_list[i], offset_array[j] + right_list[j])
+                x += width + self.padding
+        target_array = numpy.zeros((count, 2), dtype=numpy.float64)
+        for j in range(1, count):
+            i = self.parent_array[j]
+            target_array[j, 0] = target_array[i, 0] + offset_array[j]
+            target_array[j, 1] = target_array[i, 1] - self.level_height
+        return target_array
+
+    def calculate_target_rectangle(self):
+        # This is the smallest rectangle holding every node's box, once the nodes are all where they're going.
+        from math2d_aa_rect import AxisAlignedRectangle
+        from math2d_vector import Vector
+        rect = AxisAlignedRectangle()
+        if len(self.node_list) > 0:
+            min_x, min_y = self.target_array.min(axis=0).tolist()
+            max_x, max_y = self.target_array.max(axis=0).tolist()
+            rect.min_point = Vector(min_x - 0.5, min_y - 0.5)
+            rect.max_point = Vector(max_x + 0.5, max_y + 0.5)
+        return rect
+
+    def advance(self, lerp_value, eps=1e-2):
+        # This moves every node the given fraction of the way to its target, snapping it there once it's close
+        # enough, and returns False, without doing anything, if every node is already there.
+        delta_array = self.target_array - self.position_array
+        distance_array = numpy.hypot(delta_array[:, 0], delta_array[:, 1])
+        if len(distance_array) == 0 or distance_array.max() == 0.0:
+            return False
+        self.position_array += delta_array * lerp_value
+        snap_mask = distance_array < eps
+        self.position_array[snap_mask] = self.target_array[snap_mask]
+        return True
+
+    def is_settled(self):
+        return numpy.array_equal(self.position_array, self.target_array)
@@ -0,0 +1,144 @@
+# tree_renderer.py
+
+import numpy
+
+from OpenGL.GL import *
+from OpenGL.GLU import *
+from OpenGL.GLUT import *
+
+class TreeRenderer(object):
+    # This draws a tree from vertex buffers, with one draw call each for the edges, the node boxes and the
+    # node labels, rather than with a glBegin()/glEnd() pair for every node and a GLUT call for every character.
+    # Everything about the drawing that doesn't depend on where the nodes are, which is all of it but the node
+    # positions, is worked out once per tree.  Then, whenever the nodes move, the vertices are just those
+    # offsets added to the node positions, which NumPy does in one go.  All methods must be called with the
+    # OpenGL context current.
+
+    def __init__(self, font=GLUT_STROKE_ROMAN):
+        self.font = font
+        self.glyph_map = {}
+        self.text_vertex_map = {}
+        self.root_node = None
+        self.node_list = []
+        self.buffer_list = None
+        self.vertex_count_list = [0, 0, 0]
+
+    def set_tree(self, root_node, position_array):
+        if root_node is self.root_node:
+            return
+        self.root_node = root_node
+        self.node_list = list(root_node.yield_nodes()) if root_node is not None else []
+        edge_list = []
+        text_vertices_list = []
+        text_owner_list = []
+        for i, node in enumerate(self.node_list):
+            # The nodes are in pre-order, so each child comes right after the subtree of the one before it.
+            # We go by position rather than identity, because a frozen subtree may appear more than once.
+            j = i + 1
+            for child in node.child_list:
+                edge_list.append((i, j))
+                j += child.size()
+            text_vertices = self._text_vertices(node.display_text())
+            text_vertices_list.append(text_vertices)
+            text_owner_list.append(numpy.full(len(text_vertices), i, dtype=numpy.int32))
+        self.edge_index_array = numpy.array(edge_list, dtype=numpy.int32).reshape(-1)
+        if len(self.node_list) > 0:
+            self.text_vertex_array = numpy.concatenate(text_vertices_list)
+            self.text_owner_array = numpy.concatenate(text_owner_list)
+        else:
+            self.text_vertex_array = numpy.zeros((0, 2), dtype=numpy.float32)
+            self.text_owner_array = numpy.zeros(0, dtype=numpy.int32)
+        self.update_positions(position_array)
+
+    def update_positions(self, position_array):
+        # Call this whenever the nodes have moved.  The positions are given as an array with a row per node, in
+        # the order of yield_nodes(), such as a TreeAnimation keeps.
+        if self.buffer_list is None:
+            self.buffer_list = glGenBuffers(3)
+        position_array = numpy.asarray(position_array, dtype=numpy.float32).reshape(-1, 2)
+        corner_array = numpy.array([(-0.5, -0.5), (0.5, -0.5), (0.5, 0.5), (-0.5, 0.5)], dtype=numpy.float32)
+        vertex_array_list = [
+            position_array[self.edge_index_array],
+            (position_array[:, numpy.newaxis, :] + corner_array).reshape(-1, 2),
+            position_array[self.text_owner_array] + self.text_vertex_array
+        ]
+        for i, vertex_array in enumerate(vertex_array_list):
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer_list[i])
+            glBufferData(GL_ARRAY_BUFFER, numpy.ascontiguousarray(vertex_array, dtype=numpy.float32), GL_DYNAMIC_DRAW)
+            self.vertex_count_list[i] = len(vertex_array)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        if self.buffer_list is None:
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
+        try:
+            for i, (mode, color) in enumerate([(GL_LINES, (0.0, 0.0, 0.0)), (GL_QUADS, (0.8, 0.8, 0.8)), (GL_LINES, (0.0, 0.0, 0.0))]):
+                if self.vertex_count_list[i] > 0:
+                    glColor3f(*color)
+                    glBindBuffer(GL_ARRAY_BUFFER, self.buffer_list[i])
+                    glVertexPointer(2, GL_FLOAT, 0, None)
+                    glDrawArrays(mode, 0, self.vertex_count_list[i])
+        finally:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glDisableClientState(GL_VERTEX_ARRAY)
+
+    def _text_vertices(self, text):
+        # These are the line segments of the given text, relative to the center of a node, fitted into the node's
+        # box just as GLCanvas used to fit them when it drew each character with GLUT.
+        if text in self.text_vertex_map:
+            return self.text_vertex_map[text]
+        vertices_list = []
+        total_width = 0.0
+        for char in text:
+            vertices, width = self._glyph(char)
+            vertices_list.append(vertices + numpy.array([total_width, 0.0], dtype=numpy.float32))
+            total_width += width
+        # The text box is grown to the aspect ratio of the node box, which is square, and then scaled to fit it.
+        text_height = 119.05
+        expanded_width = max(total_width, text_height)
+        expanded_height = max(total_width, text_height)
+        scale = 1.0 / expanded_width
+        offset = numpy.array([-0.5, -0.5 + (expanded_height - text_height) * 0.5 * scale], dtype=numpy.float32)
+        if len(vertices_list) > 0:
+            vertices = numpy.concatenate(vertices_list) * scale + offset
+        else:
+            vertices = numpy.zeros((0, 2), dtype=numpy.float32)
+        self.text_vertex_map[text] = vertices.astype(numpy.float32)
+        return self.text_vertex_map[text]
+
+    def _glyph(self, char):
+        # GLUT gives us no way to get at the strokes of its font, so we draw each character once in feedback
+        # mode, which hands back the line segments instead of drawing them, and keep those.  The projection is
+        # chosen so that no stroke gets clipped, and then we map the window coordinates back to font units.
+        if char in self.glyph_map:
+            return self.glyph_map[char]
+        extent = 256.0
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        glFeedbackBuffer(4096, GL_2D)
+        glRenderMode(GL_FEEDBACK)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        gluOrtho2D(-extent, extent, -extent, extent)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        try:
+            glutStrokeCharacter(self.font, ord(char))
+        finally:
+            glPopMatrix()
+            glMatrixMode(GL_PROJECTION)
+            glPopMatrix()
+            glMatrixMode(GL_MODELVIEW)
+            record_list = glRenderMode(GL_RENDER)
+        point_list = []
+        for record in record_list:
+            if record[0] in (GL_LINE_TOKEN, GL_LINE_RESET_TOKEN):
+                for vertex in record[1:]:
+                    x = ((vertex.vertex[0] - viewport[0]) / viewport[2] * 2.0 - 1.0) * extent
+                    y = ((vertex.vertex[1] - viewport[1]) / viewport[3] * 2.0 - 1.0) * extent
+                    point_list.append((x, y))
+        vertices = numpy.array(point_list, dtype=numpy.float32).reshape(-1, 2)
+        self.glyph_map[char] = (vertices, float(glutStrokeWidth(self.font, ord(char))))
+        return self.glyph_map[char]
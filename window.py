@@ -6,14 +6,19 @@ from PyQt5 import QtGui, QtCore, QtWidgets, QtOpenGL
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
-from math_tree import MathTreeNode, simplify_tree
+from math_tree import MathTreeNode, make_script_globals
 from math2d_aa_rect import AxisAlignedRectangle
 from math2d_line_segment import LineSegment
 from math2d_vector import Vector
 from script_edit import ScriptEditPanel
+from simplify_worker import SimplifyWorker
+from tree_animation import TreeAnimation
+from tree_renderer import TreeRenderer
 
 class GLCanvas(QtOpenGL.QGLWidget):
     simplify_step_taken_signal = QtCore.pyqtSignal()
+    simplify_finished_signal = QtCore.pyqtSignal(str)
+    start_simplify_signal = QtCore.pyqtSignal(object, int, int, float, int, object)
     
     def __init__(self, parent):
         gl_format = QtOpenGL.QGLFormat()
@@ -24,6 +29,9 @@ class GLCanvas(QtOpenGL.QGLWidget):
         super().__init__(gl_format, parent)
         
         self.root_node = None
+        self.animation = TreeAnimation()
+        self.renderer = TreeRenderer()
+        self.positions_changed = False
         self.proj_rect = None
         self.anim_proj_rect = AxisAlignedRectangle()
         
@@ -33,14 +41,40 @@ class GLCanvas(QtOpenGL.QGLWidget):
         
         self.auto_simplify = False
 
+        # Simplification happens on a worker thread.  Each tree we're given gets a new id, so that the worker
+        # knows when to start over, and so that we can ignore any snapshots still coming for an old tree.
+        # Snapshots wait here until the last one has finished animating.
+        self.tree_id = 0
+        self.simplifying = False
+        self.simplified = False
+        self.pending_root_node = None
+        self.time_budget = 0.0
+        self.max_tree_size = 0
+        self.worker = SimplifyWorker()
+        self.worker_thread = QtCore.QThread()
+        self.worker.moveToThread(self.worker_thread)
+        self.start_simplify_signal.connect(self.worker.run)
+        self.worker.snapshot_signal.connect(self.snapshot_received)
+        self.worker.finished_signal.connect(self.simplify_finished)
+        self.worker.error_signal.connect(self.simplify_failed)
+        self.worker_thread.start()
+
         self.dragPos = None
         self.dragging = False
     
+    def shutdown(self):
+        self.worker.cancel()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+
     def set_root_node(self, node):
         self.root_node = node
+        self.tree_id += 1
+        self.simplified = False
+        self.pending_root_node = None
+        self.worker.cancel()
         if isinstance(node, MathTreeNode):
-            node.calculate_target_positions()
-            node.assign_initial_positions()
+            self.animation.set_tree(node)
             self._recalc_projection_rect()
     
     def get_root_node(self):
@@ -96,7 +130,7 @@ class GLCanvas(QtOpenGL.QGLWidget):
         viewport_rect.max_point.x = float(viewport[2])
         viewport_rect.max_point.y = float(viewport[3])
 
-        self.proj_rect = self.root_node.calculate_subtree_bounding_rectangle(targets=True)
+        self.proj_rect = self.animation.calculate_target_rectangle()
         self.proj_rect.Scale(1.1)
         self.proj_rect.ExpandToMatchAspectRatioOf(viewport_rect)
 
@@ -119,69 +153,25 @@ class GLCanvas(QtOpenGL.QGLWidget):
             glMatrixMode(GL_MODELVIEW)
             glLoadIdentity()
             
-            glBegin(GL_LINES)
-            try:
-                glColor3f(0.0, 0.0, 0.0)
-                self._render_edges(self.root_node)
-            finally:
-                glEnd()
-            
-            for node in self.root_node.yield_nodes():
-                self._render_node(node)
+            # The renderer only rebuilds its buffers when we have a new tree, or the nodes have moved.
+            if self.renderer.root_node is not self.root_node:
+                self.renderer.set_tree(self.root_node, self.animation.position_array)
+            elif self.positions_changed:
+                self.renderer.update_positions(self.animation.position_array)
+            self.positions_changed = False
+            self.renderer.draw()
         
         glFlush()
-    
-    def _render_node(self, node):
-        rect = node.calculate_bounding_rectangle(targets=False)
-        glBegin(GL_QUADS)
-        try:
-            glColor3f(0.8, 0.8, 0.8)
-            glVertex2f(rect.min_point.x, rect.min_point.y)
-            glVertex2f(rect.max_point.x, rect.min_point.y)
-            glVertex2f(rect.max_point.x, rect.max_point.y)
-            glVertex2f(rect.min_point.x, rect.max_point.y)
-        finally:
-            glEnd()
-
-        glColor3f(0.0, 0.0, 0.0)
-        self._render_text(GLUT_STROKE_ROMAN, node.display_text(), rect)
-
-    def _render_text(self, font, text, rect):
-        total_width = 0.0
-        for char in text:
-            width = glutStrokeWidth(font, ord(char))
-            total_width += float(width)
-        text_rect = AxisAlignedRectangle()
-        text_rect.min_point.x = 0.0
-        text_rect.max_point.x = total_width
-        text_rect.min_point.y = 0.0
-        text_rect.max_point.y = 119.05
-        original_height = text_rect.Height()
-        text_rect.ExpandToMatchAspectRatioOf(rect)
-        height = text_rect.Height()
-        scale = rect.Width() / text_rect.Width()
-        glPushMatrix()
-        try:
-            glTranslatef(rect.min_point.x, rect.min_point.y + (height - original_height) * 0.5 * scale, 0.0)
-            glScalef(scale, scale, 1.0)
-            for char in text:
-                glutStrokeCharacter(font, ord(char))
-        finally:
-            glPopMatrix()
-
-    def _render_edges(self, node):
-        for child in node.child_list:
-            glVertex2f(node.position.x, node.position.y)
-            glVertex2f(child.position.x, child.position.y)
-            self._render_edges(child)
 
     def animation_tick(self):
         if isinstance(self.root_node, MathTreeNode):
-            if not self.root_node.is_settled():
-                self.root_node.advance_positions(0.3)
+            if self.animation.advance(0.3):
+                self.positions_changed = True
                 self.update()
-            elif self.auto_simplify:
-                self.do_simplify_step()
+            elif self.pending_root_node is not None:
+                self._take_pending_root_node()
+            elif self.auto_simplify and not self.simplifying and not self.simplified:
+                self._start_simplifying(0)
         if self.proj_rect is not None:
             if ((self.anim_proj_rect.min_point - self.proj_rect.min_point).Length() > 0.0 or
                 (self.anim_proj_rect.max_point - self.proj_rect.max_point).Length() > 0.0):
@@ -190,24 +180,49 @@ class GLCanvas(QtOpenGL.QGLWidget):
                 self.update()
     
     def do_simplify_step(self):
-        if isinstance(self.root_node, MathTreeNode):
-            try:
-                new_root_node = simplify_tree(self.root_node, max_iters=1)
-            except Exception as ex:
-                tb = traceback.format_exc()
-                error = str(ex)
-                msgBox = QtWidgets.QMessageBox(parent=self)
-                msgBox.setWindowTitle('Simplification error!')
-                msgBox.setText('ERROR: ' + str(error) + '\n\n' + tb)
-                msgBox.setStandardButtons(QtWidgets.QMessageBox.Ok)
-                msgBox.exec_()
-                self.auto_simplify = False
-            else:
-                self.root_node = new_root_node
-                self.root_node.calculate_target_positions()
-                self.root_node.assign_initial_positions()
-                self.update()
-                self.simplify_step_taken_signal.emit()
+        if isinstance(self.root_node, MathTreeNode) and not self.simplifying:
+            self._start_simplifying(1)
+
+    def cancel_simplify(self):
+        self.auto_simplify = False
+        self.worker.cancel()
+
+    def _start_simplifying(self, max_steps):
+        # We may be ahead of what's been animated, so we carry on from the latest tree we've been sent.
+        self.simplifying = True
+        root_node = self.root_node if self.pending_root_node is None else self.pending_root_node
+        self.start_simplify_signal.emit(root_node, self.tree_id, max_steps, self.time_budget, self.max_tree_size, self.worker.make_cancel_event())
+
+    def snapshot_received(self, root_node, tree_id):
+        if tree_id == self.tree_id:
+            self.pending_root_node = root_node
+
+    def simplify_finished(self, reason, tree_id):
+        self.simplifying = False
+        if tree_id != self.tree_id:
+            return
+        if reason == 'Simplified.':
+            self.simplified = True
+        elif reason != '':
+            self.auto_simplify = False
+        self.simplify_finished_signal.emit(reason)
+
+    def simplify_failed(self, error):
+        self.auto_simplify = False
+        msgBox = QtWidgets.QMessageBox(parent=self)
+        msgBox.setWindowTitle('Simplification error!')
+        msgBox.setText(error)
+        msgBox.setStandardButtons(QtWidgets.QMessageBox.Ok)
+        msgBox.exec_()
+
+    def _take_pending_root_node(self):
+        root_node = self.pending_root_node
+        self.pending_root_node = None
+        # Each snapshot is a new tree, but whatever it has in common with the old one should stay where it is.
+        self.root_node = root_node
+        self.animation.set_tree(root_node, carry_positions=True)
+        self.update()
+        self.simplify_step_taken_signal.emit()
 
 class Window(QtWidgets.QMainWindow):
     def __init__(self):
@@ -219,6 +234,7 @@ class Window(QtWidgets.QMainWindow):
 
         self.canvas = GLCanvas(self)
         self.canvas.simplify_step_taken_signal.connect(self.simplify_step_taken)
+        self.canvas.simplify_finished_signal.connect(self.simplify_finished)
         
         self.line_edit = QtWidgets.QLineEdit()
         self.line_edit.returnPressed.connect(self.line_edit_enter_pressed)
@@ -233,16 +249,40 @@ class Window(QtWidgets.QMainWindow):
         self.auto_simplify_check = QtWidgets.QCheckBox('Auto Simplify')
         self.auto_simplify_check.clicked.connect(self.auto_simplify_check_pressed)
         self.auto_simplify_check.setFixedWidth(80)
+
+        cancel_button = QtWidgets.QPushButton('Cancel')
+        cancel_button.setFixedWidth(60)
+        cancel_button.clicked.connect(self.cancel_button_pressed)
+
+        # A budget of zero means no limit.
+        self.time_budget_spin = QtWidgets.QDoubleSpinBox()
+        self.time_budget_spin.setRange(0.0, 3600.0)
+        self.time_budget_spin.setSuffix(' s')
+        self.time_budget_spin.setToolTip('Time budget for each simplification (0 for none)')
+        self.time_budget_spin.valueChanged.connect(self.budget_changed)
+
+        self.max_tree_size_spin = QtWidgets.QSpinBox()
+        self.max_tree_size_spin.setRange(0, 10000000)
+        self.max_tree_size_spin.setSingleStep(1000)
+        self.max_tree_size_spin.setToolTip('Largest tree allowed while simplifying (0 for no limit)')
+        self.max_tree_size_spin.valueChanged.connect(self.budget_changed)
+
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setFixedHeight(20)
         
         top_layout = QtWidgets.QHBoxLayout()
         top_layout.addWidget(simplify_button)
         top_layout.addWidget(self.expression_label)
         top_layout.addWidget(self.auto_simplify_check)
+        top_layout.addWidget(cancel_button)
+        top_layout.addWidget(self.time_budget_spin)
+        top_layout.addWidget(self.max_tree_size_spin)
         
         main_layout = QtWidgets.QVBoxLayout()
         main_layout.addLayout(top_layout)
         main_layout.addWidget(self.canvas)
         main_layout.addWidget(self.line_edit)
+        main_layout.addWidget(self.status_label)
         
         main_widget = QtWidgets.QWidget()
         main_widget.setLayout(main_layout)
@@ -254,8 +294,24 @@ class Window(QtWidgets.QMainWindow):
         
         self.addDockWidget(QtCore.Qt.RightDockWidgetArea, script_edit_panel)
     
+    def closeEvent(self, event):
+        self.canvas.shutdown()
+        super().closeEvent(event)
+
     def auto_simplify_check_pressed(self):
         self.canvas.auto_simplify = self.auto_simplify_check.isChecked()
+
+    def cancel_button_pressed(self):
+        self.canvas.cancel_simplify()
+        self.auto_simplify_check.setChecked(False)
+
+    def budget_changed(self):
+        self.canvas.time_budget = self.time_budget_spin.value()
+        self.canvas.max_tree_size = self.max_tree_size_spin.value()
+
+    def simplify_finished(self, reason):
+        self.status_label.setText(reason)
+        self.auto_simplify_check.setChecked(self.canvas.auto_simplify)
     
     def script_edit_execute_pressed(self, code):
         self._execute_code(code)
@@ -266,24 +322,7 @@ class Window(QtWidgets.QMainWindow):
             self.line_edit.clear()
     
     def _execute_code(self, code):
-        from math_tree import MathTreeNode
-
-        globals_dict = {
-            '_n': lambda x: MathTreeNode(x),
-            'inv': lambda x: MathTreeNode('inv', [x]),
-            'rev': lambda x: MathTreeNode('rev', [x]),
-            'e1': MathTreeNode('e1'),
-            'e2': MathTreeNode('e2'),
-            'e3': MathTreeNode('e3'),
-            'no': MathTreeNode('no'),
-            'ni': MathTreeNode('ni'),
-            '_v': lambda x, y, z: MathTreeNode('+', [
-                MathTreeNode('*', [MathTreeNode(x), MathTreeNode('e1')]),
-                MathTreeNode('*', [MathTreeNode(y), MathTreeNode('e2')]),
-                MathTreeNode('*', [MathTreeNode(z), MathTreeNode('e3')])
-            ]),
-            'simplify': simplify_tree
-        }
+        globals_dict = make_script_globals()
 
         try:
             exec(code, globals_dict, self.locals_dict)